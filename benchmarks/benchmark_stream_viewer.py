@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Benchmarks of the StreamViewer timeline on synthetic streams.
+
+Each measure is written as one JSON object per line, tagged with the current
+commit, so that runs made on different commits can be compared.
+
+Usage::
+
+	python benchmarks/benchmark_stream_viewer.py -o results.jsonl
+"""
+
+# Standard libraries
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+# Third-party libraries
+import numpy
+from PySide import QtCore, QtGui
+
+# Local modules
+from qidata_gui._subwidgets import StreamViewer
+from qidata_gui._subwidgets.stream_index import NSEC_PER_SEC
+
+#: Total number of messages in the generated streams
+STAMP_COUNTS = [1000, 100000, 1000000]
+
+#: Number of generated streams
+STREAM_COUNTS = [1, 4, 32]
+
+#: Size of the offscreen timeline
+VIEW_SIZE = (1200, 400)
+
+# ──────────
+# Generation
+
+def makeStreams(stamp_count, stream_count, rate=30.0, seed=0):
+	"""
+	Generate streams of regularly spaced messages with some jitter and a
+	few dropouts
+
+	:param stamp_count: Total number of messages
+	:type stamp_count: int
+	:param stream_count: Number of streams sharing these messages
+	:type stream_count: int
+	:param rate: Average rate of each stream (in Hz)
+	:type rate: float
+	:param seed: Seed of the random generator
+	:type seed: int
+	:return: Map from stream names to streams
+	:rtype: dict
+	"""
+	random = numpy.random.RandomState(seed)
+	streams = dict()
+	period = int(NSEC_PER_SEC / rate)
+	for stream_number in range(stream_count):
+		count = stamp_count // stream_count
+		intervals = period + random.randint(-period//10, period//10+1, count)
+		dropouts = random.random_sample(count) < 0.001
+		intervals[dropouts] *= 10
+		stamps = 1500000000 * NSEC_PER_SEC + numpy.cumsum(intervals)
+		name = "stream_%02d" % stream_number
+		streams[name] = dict(
+		    [((s // NSEC_PER_SEC, s % NSEC_PER_SEC), "%s/%d.png" % (name, i))\
+		         for (i, s) in enumerate(stamps.tolist())]
+		)
+	return streams
+
+# ───────────
+# Measurement
+
+def measure(function, calls=1, repeat=5):
+	"""
+	Time a function
+
+	:param function: Function to call, without argument
+	:type function: callable
+	:param calls: Number of calls in each run
+	:type calls: int
+	:param repeat: Number of runs
+	:type repeat: int
+	:return: Minimum, median and mean duration of one call (in s)
+	:rtype: dict
+	"""
+	durations = []
+	for _ in range(repeat):
+		start = time.time()
+		for _ in range(calls):
+			function()
+		durations.append((time.time() - start) / calls)
+	return dict(min=min(durations),
+	            median=float(numpy.median(durations)),
+	            mean=float(numpy.mean(durations)),
+	            calls=calls,
+	            repeat=repeat)
+
+def paintTimeline(widget, image, invalidate):
+	"""
+	Paint the whole timeline of a StreamViewer in an offscreen image
+
+	:param widget: Viewer whose timeline is painted
+	:type widget: qidata_gui._subwidgets.StreamViewer
+	:param image: Image to paint into
+	:type image: QtGui.QImage
+	:param invalidate: If True, render the cached static layer again
+	:type invalidate: bool
+	"""
+	timeline = widget._timeline
+	if invalidate:
+		timeline.invalidate_static_layer()
+	option = QtGui.QStyleOptionGraphicsItem()
+	option.exposedRect = timeline.boundingRect()
+	painter = QtGui.QPainter(image)
+	timeline.paint(painter, option, None)
+	painter.end()
+
+# ──────────
+# Benchmarks
+
+def benchmarkStreams(stamp_count, stream_count, repeat):
+	"""
+	Run all benchmarks on one set of synthetic streams
+
+	:return: list of results, one per benchmark
+	:rtype: list
+	"""
+	streams = makeStreams(stamp_count, stream_count)
+	results = []
+	def record(name, result):
+		result.update(benchmark=name, stamps=stamp_count, streams=stream_count)
+		results.append(result)
+
+	widget = [None]
+	def construct():
+		widget[0] = StreamViewer(streams)
+	record("construction", measure(construct, repeat=repeat))
+	widget = widget[0]
+	widget.resize(*VIEW_SIZE)
+	widget.view.resize(*VIEW_SIZE)
+
+	image = QtGui.QImage(VIEW_SIZE[0], VIEW_SIZE[1], QtGui.QImage.Format_ARGB32)
+	paintTimeline(widget, image, True)
+	record("paint_cold",
+	       measure(lambda: paintTimeline(widget, image, True), repeat=repeat))
+	record("paint_warm",
+	       measure(lambda: paintTimeline(widget, image, False), 10, repeat))
+	widget.density_shading = True
+	widget.gap_threshold = 2.0
+	record("paint_shaded_cold",
+	       measure(lambda: paintTimeline(widget, image, True), repeat=repeat))
+	widget.density_shading = False
+	widget.gap_threshold = None
+	timeline = widget._timeline
+	timeline.zoom(0.01, timeline._start_stamp)
+	record("paint_zoomed_cold",
+	       measure(lambda: paintTimeline(widget, image, True), repeat=repeat))
+	timeline.reset_zoom()
+
+	timeline.current_pos = None
+	widget.moveToNextFrame()
+	calls = max(min(1000, stamp_count // repeat - 1), 1)
+	record("move_to_next_frame", measure(widget.moveToNextFrame, calls, repeat))
+
+	random = numpy.random.RandomState(0)
+	queries = iter(random.randint(timeline._start_stamp,
+	                              timeline._end_stamp,
+	                              1000*repeat).tolist())
+	record("get_file_at_stamp",
+	       measure(lambda: widget.getFileAtStamp(next(queries)), 1000, repeat))
+
+	# Drag the cursor across the timeline, as a user scrubbing through it
+	y = (timeline._history_top + timeline._history_bottom) / 2.0
+	positions = iter(numpy.tile(
+	                     numpy.linspace(timeline._history_left,
+	                                    timeline._history_left + timeline._history_width,
+	                                    500),
+	                     repeat
+	                 ).tolist())
+	def scrub():
+		timeline._moveCurrentPosTo(QtCore.QPointF(next(positions), y))
+		widget.getFileAtStamp(timeline.current_pos)
+	record("scrub", measure(scrub, 500, repeat))
+
+	widget.close()
+	return results
+
+def currentCommit():
+	"""
+	Return the commit of the benchmarked sources, if known
+	"""
+	try:
+		return subprocess.check_output(["git", "rev-parse", "HEAD"]).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def main(args):
+	app = QtGui.QApplication.instance() or QtGui.QApplication(sys.argv)
+	context = dict(commit=currentCommit(),
+	               python=platform.python_version(),
+	               date=time.strftime("%Y-%m-%dT%H:%M:%S"))
+	output = open(args.output, "a") if args.output else sys.stdout
+	try:
+		for stamp_count in args.stamps:
+			for stream_count in args.streams:
+				for result in benchmarkStreams(stamp_count, stream_count, args.repeat):
+					result.update(context)
+					output.write(json.dumps(result, sort_keys=True) + "\n")
+					output.flush()
+	finally:
+		if output is not sys.stdout:
+			output.close()
+
+def make_command_parser(parser=argparse.ArgumentParser(description=__doc__)):
+	parser.add_argument("-o", "--output",
+	                    help="File to append the results to (defaults to the \
+	                    standard output)")
+	parser.add_argument("--stamps", type=int, nargs="+", default=STAMP_COUNTS,
+	                    help="Total numbers of messages to benchmark")
+	parser.add_argument("--streams", type=int, nargs="+", default=STREAM_COUNTS,
+	                    help="Numbers of streams to benchmark")
+	parser.add_argument("--repeat", type=int, default=5,
+	                    help="Number of runs of each benchmark")
+	parser.set_defaults(func=main)
+	return parser
+
+# ───────────────────
+# Add a main launcher
+
+if __name__ == "__main__":
+	parser = make_command_parser()
+	parsed_args = parser.parse_args(sys.argv[1:])
+	parsed_args.func(parsed_args)
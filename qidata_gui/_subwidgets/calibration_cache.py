@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Process-wide cache of the tables derived from camera calibrations
+"""
+
+# Standard libraries
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+
+# Third-party libraries
+import cv2
+import numpy
+
+#: Extension of the tables saved on disk
+CALIBRATION_EXTENSION = ".calibration.npz"
+
+class CalibrationCache(object):
+	"""
+	Bounded cache of the undistortion tables of cameras.
+
+	Every frame of a stream shares the same calibration, so the tables are
+	computed once per calibration and the most recently used ones are kept
+	in memory. If a cache folder is set, they are also saved there and
+	reused by later sessions.
+	"""
+
+	# ───────────
+	# Constructor
+
+	def __init__(self, max_size=32, cache_dir=None):
+		"""
+		CalibrationCache constructor
+
+		:param max_size: Maximum number of tables kept in memory
+		:type max_size: int
+		:param cache_dir: Folder where tables are saved (optional)
+		:type cache_dir: str
+		"""
+		self.max_size = max_size
+		self.cache_dir = cache_dir
+		self._tables = OrderedDict() # key -> tuple of arrays
+		self._lock = threading.Lock()
+
+	# ──────────
+	# Public API
+
+	def getRayGrid(self, camera_matrix, distortion_coeffs, width, height):
+		"""
+		Return the undistorted, normalized ray (x/z, y/z) seen by each pixel
+		of a camera.
+
+		:param camera_matrix: Intrinsic matrix of the camera
+		:type camera_matrix: list
+		:param distortion_coeffs: Distortion coefficients of the camera
+		:type distortion_coeffs: list
+		:param width: Width of the images
+		:type width: int
+		:param height: Height of the images
+		:type height: int
+		:return: Array of shape (height, width, 2)
+		:rtype: numpy.ndarray
+		"""
+		def compute(camera_matrix, distortion_coeffs):
+			xs, ys = numpy.meshgrid(numpy.arange(width, dtype=numpy.float32),
+			                        numpy.arange(height, dtype=numpy.float32))
+			pixels = numpy.dstack((xs, ys)).reshape(-1, 1, 2)
+			rays = cv2.undistortPoints(pixels, camera_matrix, distortion_coeffs)
+			return (rays.reshape(height, width, 2),)
+
+		return self._get("rays", camera_matrix, distortion_coeffs,
+		                 width, height, compute)[0]
+
+	def getUndistortionMaps(self, camera_matrix, distortion_coeffs, width, height):
+		"""
+		Return the tables given to ``cv2.remap`` to undistort the images of a
+		camera, keeping the same camera matrix.
+
+		:param camera_matrix: Intrinsic matrix of the camera
+		:type camera_matrix: list
+		:param distortion_coeffs: Distortion coefficients of the camera
+		:type distortion_coeffs: list
+		:param width: Width of the images
+		:type width: int
+		:param height: Height of the images
+		:type height: int
+		:return: Source x and y coordinates of each pixel, both of shape
+		         (height, width)
+		:rtype: tuple
+		"""
+		def compute(camera_matrix, distortion_coeffs):
+			return cv2.initUndistortRectifyMap(camera_matrix,
+			                                   distortion_coeffs,
+			                                   None,
+			                                   camera_matrix,
+			                                   (width, height),
+			                                   cv2.CV_32FC1)
+
+		return self._get("remap", camera_matrix, distortion_coeffs,
+		                 width, height, compute)
+
+	def clear(self):
+		"""
+		Empty the memory cache (tables saved on disk are kept)
+		"""
+		with self._lock:
+			self._tables = OrderedDict()
+
+	# ───────────
+	# Private API
+
+	def _get(self, kind, camera_matrix, distortion_coeffs, width, height, compute):
+		"""
+		Return a table from the memory cache, the disk cache or computed
+
+		:param kind: Name of the table
+		:type kind: str
+		:param compute: Function computing the table from the calibration
+		:type compute: function
+		:rtype: tuple
+		"""
+		camera_matrix = numpy.array(camera_matrix, dtype=numpy.float64)
+		distortion_coeffs = numpy.array(distortion_coeffs, dtype=numpy.float64)
+		key = self._key(kind, camera_matrix, distortion_coeffs, width, height)
+		with self._lock:
+			if key in self._tables:
+				# Mark it as the most recently used
+				tables = self._tables.pop(key)
+				self._tables[key] = tables
+				return tables
+
+		tables = self._loadFromDisk(key)
+		if tables is None:
+			tables = tuple(compute(camera_matrix, distortion_coeffs))
+			self._saveToDisk(key, tables)
+
+		with self._lock:
+			self._tables[key] = tables
+			while len(self._tables) > self.max_size:
+				self._tables.popitem(last=False)
+		return tables
+
+	def _key(self, kind, camera_matrix, distortion_coeffs, width, height):
+		"""
+		Hash a calibration and the resolution of its images
+		"""
+		digest = hashlib.sha1()
+		digest.update(camera_matrix.tostring())
+		digest.update(distortion_coeffs.tostring())
+		digest.update(numpy.array([width, height], dtype=numpy.int64).tostring())
+		return "%s.%s" % (digest.hexdigest(), kind)
+
+	def _loadFromDisk(self, key):
+		if self.cache_dir is None:
+			return None
+		cache_path = os.path.join(self.cache_dir, key + CALIBRATION_EXTENSION)
+		if not os.path.exists(cache_path):
+			return None
+		try:
+			with numpy.load(cache_path) as archive:
+				return tuple(archive["arr_%d"%i] for i in range(len(archive.files)))
+		except (IOError, ValueError):
+			# Damaged file, it will be computed and saved again
+			return None
+
+	def _saveToDisk(self, key, tables):
+		if self.cache_dir is None:
+			return
+		try:
+			if not os.path.isdir(self.cache_dir):
+				os.makedirs(self.cache_dir)
+			numpy.savez(os.path.join(self.cache_dir, key + CALIBRATION_EXTENSION),
+			            *tables)
+		except (IOError, OSError):
+			# The disk cache is optional, the tables are still usable
+			pass
+
+#: Cache shared by the whole process
+_calibration_cache = CalibrationCache()
+
+def getCalibrationCache():
+	"""
+	Return the calibration cache shared by the whole process. Set its
+	``cache_dir`` to keep the tables between sessions.
+
+	:rtype: CalibrationCache
+	"""
+	return _calibration_cache
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Process-wide cache of the content of QiData files
+"""
+
+# Standard libraries
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+import os
+import threading
+
+# Third-party libraries
+import qidata
+
+class LoadedFile(object):
+	"""
+	Content of a QiData file, read at once
+	"""
+
+	def __init__(self, path, mtime, data_type, transform, raw_data):
+		"""
+		LoadedFile constructor
+
+		:param path: Path of the file
+		:type path: str
+		:param mtime: Modification time of the file when it was read
+		:type mtime: float
+		:param data_type: Type of the file
+		:type data_type: qidata.DataType
+		:param transform: Position of the sensor
+		:type transform: qidata.metadata_objects.Transform
+		:param raw_data: Decoded data (for images, pixels and camera info)
+		"""
+		self.path = path
+		self.mtime = mtime
+		self.type = data_type
+		self.transform = transform
+		self.raw_data = raw_data
+		pixels = getattr(raw_data, "numpy_image", None)
+		self.size = pixels.nbytes if pixels is not None else 0
+
+class PendingFile(object):
+	"""
+	File being read in background. Its type and transform are known before
+	its raw data is decoded.
+	"""
+
+	def __init__(self, path):
+		"""
+		PendingFile constructor
+
+		:param path: Path of the file
+		:type path: str
+		"""
+		self.path = path
+		self.type = None
+		self.transform = None
+		self._metadata_read = threading.Event()
+		self._result = None
+
+	def waitForMetadata(self):
+		"""
+		Wait until the type and transform of the file are read. Errors raised
+		while opening the file are raised again here.
+		"""
+		while not self._metadata_read.wait(0.01):
+			if self._result.ready():
+				# Reading failed before the metadata
+				self._result.get()
+
+	def isReady(self):
+		"""
+		Tell if the file is read, or if reading it failed
+		"""
+		return self._result.ready()
+
+	def get(self):
+		"""
+		Return the content of a read file. Errors raised while reading it
+		are raised again here.
+
+		:rtype: LoadedFile
+		"""
+		return self._result.get()
+
+	def _setMetadata(self, data_type, transform):
+		self.type = data_type
+		self.transform = transform
+		self._metadata_read.set()
+
+class FileCache(object):
+	"""
+	Bounded cache of decoded QiData files.
+
+	Each file is opened and decoded once, and the most recently used ones are
+	kept in memory, within a number of files and a number of bytes of
+	pixels. A file modified since it was read is read again.
+	"""
+
+	# ───────────
+	# Constructor
+
+	def __init__(self, max_size=32, max_bytes=512*1024*1024, worker_count=4):
+		"""
+		FileCache constructor
+
+		:param max_size: Maximum number of files kept in memory
+		:type max_size: int
+		:param max_bytes: Maximum size of the pixels kept in memory
+		:type max_bytes: int
+		:param worker_count: Number of threads reading files in background
+		:type worker_count: int
+		"""
+		self.max_size = max_size
+		self.max_bytes = max_bytes
+		self._worker_count = worker_count
+		self._pool = None # created when first needed
+		self._files = OrderedDict() # path -> LoadedFile
+		self._size = 0
+		self._lock = threading.Lock()
+
+	# ──────────
+	# Public API
+
+	def get(self, path):
+		"""
+		Return the content of a file, reading it if needed
+
+		:param path: Path of the file
+		:type path: str
+		:rtype: LoadedFile
+		"""
+		mtime = os.path.getmtime(path)
+		loaded_file = self._lookup(path, mtime)
+		if loaded_file is not None:
+			return loaded_file
+
+		with qidata.open(path) as qidata_file:
+			loaded_file = LoadedFile(path,
+			                         mtime,
+			                         qidata_file.type,
+			                         qidata_file.transform,
+			                         qidata_file.raw_data)
+		self._insert(loaded_file)
+		return loaded_file
+
+	def getOpenFile(self, qidata_file):
+		"""
+		Return the content of a file already opened by the caller, without
+		opening the file again.
+
+		Files opened in read-only mode are taken from the cache, or added to
+		it. Files opened in write mode are never cached, as their raw data
+		may be changed without being saved.
+
+		:param qidata_file: Opened file
+		:type qidata_file: qidata.QiDataSensorFile
+		:rtype: LoadedFile
+		"""
+		path = qidata_file.name
+		mtime = os.path.getmtime(path)
+		if qidata_file.read_only:
+			loaded_file = self._lookup(path, mtime)
+			if loaded_file is not None:
+				return loaded_file
+		loaded_file = LoadedFile(path,
+		                         mtime,
+		                         qidata_file.type,
+		                         qidata_file.transform,
+		                         qidata_file.raw_data)
+		if qidata_file.read_only:
+			self._insert(loaded_file)
+		return loaded_file
+
+	def getAsync(self, path):
+		"""
+		Return the content of a file, read in a background thread if needed.
+
+		:param path: Path of the file
+		:type path: str
+		:rtype: PendingFile
+		"""
+		return self.getAllAsync([path])[0]
+
+	def getAllAsync(self, paths):
+		"""
+		Return the content of several files, read in background threads if
+		needed. Decoders release the GIL, so several files are read
+		concurrently.
+
+		Each file is opened once. The metadata of all the files are read
+		before any of them is decoded, so that waiting for metadata never
+		waits for the decoding of other files.
+
+		:param paths: Paths of the files
+		:type paths: list
+		:rtype: list
+		"""
+		if self._pool is None:
+			self._pool = ThreadPool(self._worker_count)
+		pending_files = [PendingFile(path) for path in paths]
+		opened_files = [
+		    self._pool.apply_async(self._open, (pending_file,))
+		        for pending_file in pending_files
+		]
+		for (pending_file, opened_file) in zip(pending_files, opened_files):
+			pending_file._result = self._pool.apply_async(
+			                           self._decode,
+			                           (pending_file.path, opened_file)
+			                       )
+		return pending_files
+
+	def clear(self):
+		"""
+		Empty the cache
+		"""
+		with self._lock:
+			self._files = OrderedDict()
+			self._size = 0
+
+	# ───────────
+	# Private API
+
+	def _lookup(self, path, mtime):
+		"""
+		Return the cached content of a file, None if it is not cached or was
+		modified since it was read
+
+		:param path: Path of the file
+		:type path: str
+		:param mtime: Current modification time of the file
+		:type mtime: float
+		:rtype: LoadedFile
+		"""
+		with self._lock:
+			loaded_file = self._files.pop(path, None)
+			if loaded_file is not None and loaded_file.mtime != mtime:
+				# Modified since it was read
+				self._size -= loaded_file.size
+				loaded_file = None
+			if loaded_file is not None:
+				# Keep it as the most recently used
+				self._files[path] = loaded_file
+		return loaded_file
+
+	def _open(self, pending_file):
+		"""
+		Open a file and read its metadata, unless it is cached
+
+		:param pending_file: File being read
+		:type pending_file: PendingFile
+		:return: Modification time of the file, and its cached content or
+		         the opened file
+		:rtype: tuple
+		"""
+		mtime = os.path.getmtime(pending_file.path)
+		loaded_file = self._lookup(pending_file.path, mtime)
+		if loaded_file is not None:
+			pending_file._setMetadata(loaded_file.type, loaded_file.transform)
+			return (mtime, loaded_file)
+
+		qidata_file = qidata.open(pending_file.path)
+		try:
+			pending_file._setMetadata(qidata_file.type, qidata_file.transform)
+		except Exception:
+			qidata_file.close()
+			raise
+		return (mtime, qidata_file)
+
+	def _decode(self, path, opened_file):
+		"""
+		Decode the raw data of a file opened by :meth:`_open`, and close it
+
+		:param path: Path of the file
+		:type path: str
+		:param opened_file: Pending result of :meth:`_open`
+		:type opened_file: multiprocessing.pool.AsyncResult
+		:rtype: LoadedFile
+		"""
+		mtime, qidata_file = opened_file.get()
+		if isinstance(qidata_file, LoadedFile):
+			# Already cached
+			return qidata_file
+		try:
+			loaded_file = LoadedFile(path,
+			                         mtime,
+			                         qidata_file.type,
+			                         qidata_file.transform,
+			                         qidata_file.raw_data)
+		finally:
+			qidata_file.close()
+		self._insert(loaded_file)
+		return loaded_file
+
+	def _insert(self, loaded_file):
+		"""
+		Add the content of a file to the cache, evicting the least recently
+		used files if needed
+
+		:param loaded_file: Content of the file
+		:type loaded_file: LoadedFile
+		"""
+		with self._lock:
+			previous_file = self._files.pop(loaded_file.path, None)
+			if previous_file is not None:
+				# Also read by another thread
+				self._size -= previous_file.size
+			self._files[loaded_file.path] = loaded_file
+			self._size += loaded_file.size
+			while len(self._files) > 1 and (len(self._files) > self.max_size
+			                                or self._size > self.max_bytes):
+				_, evicted_file = self._files.popitem(last=False)
+				self._size -= evicted_file.size
+
+#: Cache shared by the whole process
+_file_cache = FileCache()
+
+def getFileCache():
+	"""
+	Return the file cache shared by the whole process
+
+	:rtype: FileCache
+	"""
+	return _file_cache
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Standard libraries
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+import threading
+
+class FramePrefetcher(object):
+	"""
+	Loads files in background threads ahead of their display.
+
+	Files requested through :meth:`prefetch` are loaded by a pool of worker
+	threads and kept in a bounded buffer until they are taken. Files that are
+	no longer requested when a worker picks them up are skipped, so that
+	workers never fall behind on files that will not be displayed.
+	"""
+
+	# ───────────
+	# Constructor
+
+	def __init__(self, loader, max_size=8, worker_count=2):
+		"""
+		FramePrefetcher constructor
+
+		:param loader: Function loading a file from its name. Its result
+		               must have a ``close`` method.
+		:type loader: callable
+		:param max_size: Maximum number of files kept in the buffer
+		:type max_size: int
+		:param worker_count: Number of loading threads
+		:type worker_count: int
+		"""
+		self._loader = loader
+		self._max_size = max_size
+		self._pool = ThreadPool(worker_count)
+		self._lock = threading.Lock()
+		self._buffer = OrderedDict() # file name -> pending or loaded result
+		self._discarded = [] # results to close once loaded
+
+	# ──────────
+	# Public API
+
+	def prefetch(self, file_names):
+		"""
+		Request files to be loaded in the background. Previously requested
+		files which are not in the new list are discarded.
+
+		:param file_names: Files to load, by order of priority
+		:type file_names: list
+		"""
+		file_names = file_names[:self._max_size]
+		with self._lock:
+			for file_name in list(self._buffer.keys()):
+				if file_name not in file_names:
+					self._discarded.append(self._buffer.pop(file_name))
+			for file_name in file_names:
+				if file_name not in self._buffer:
+					self._buffer[file_name] = self._pool.apply_async(
+					                              self._load,
+					                              (file_name,)
+					                          )
+		self._closeDiscarded()
+
+	def isReady(self, file_name):
+		"""
+		Tell if a requested file is loaded, or if loading it failed
+
+		:param file_name: Requested file
+		:type file_name: str
+		:rtype: bool
+		"""
+		with self._lock:
+			result = self._buffer.get(file_name)
+		return result is not None and result.ready()
+
+	def take(self, file_name):
+		"""
+		Remove a loaded file from the buffer and return it. The caller is
+		then responsible for closing it.
+
+		:param file_name: File to retrieve
+		:type file_name: str
+		:return: The loaded file, None if it is not loaded (yet)
+		"""
+		with self._lock:
+			result = self._buffer.get(file_name)
+			if result is None or not result.ready():
+				return None
+			self._buffer.pop(file_name)
+		if not result.successful():
+			# Loading failed, the file is skipped
+			return None
+		return result.get()
+
+	def clear(self):
+		"""
+		Discard every requested file
+		"""
+		self.prefetch([])
+
+	def close(self):
+		"""
+		Discard every requested file and stop the loading threads
+		"""
+		self.clear()
+		self._pool.close()
+		self._pool.join()
+		self._closeDiscarded()
+
+	# ───────────
+	# Private API
+
+	def _load(self, file_name):
+		with self._lock:
+			if file_name not in self._buffer:
+				# Not requested anymore
+				return None
+		return self._loader(file_name)
+
+	def _closeDiscarded(self):
+		"""
+		Close discarded files whose loading is over
+		"""
+		with self._lock:
+			pending = []
+			for result in self._discarded:
+				if not result.ready():
+					pending.append(result)
+				elif result.successful() and result.get() is not None:
+					result.get().close()
+			self._discarded = pending
@@ -34,19 +34,29 @@ import os
 import uuid
 
 # Third-party libraries
-import cv2
-from image import Image
 import numpy
 from PySide import QtGui, QtCore
-import qidata
 from qidata import DataType
 from qidata.metadata_objects import Transform
 
 # Local modules
 from qidata_gui import RESOURCES_DIR
+from .file_cache import getFileCache
+from .point_cloud import (
+                          DEFAULT_POINT_BUDGET,
+                          orbitRotation,
+                          planeRotation,
+                          PointCloudJob,
+                          PointCloudLOD,
+                          rasterize,
+                          transform_matrix,
+                         )
 from .raw_data_display_widgets import makeRawDataWidget
 from .raw_data_display_widgets.graphics_elements import Scene, AnnotationItem
 
+#: Interval at which files and point clouds loaded in background are polled (ms)
+LOADING_POLL_INTERVAL = 20
+
 class Projected3DROI(QtGui.QGraphicsRectItem, AnnotationItem):
 	"""
 	Item to show the position of an object on an image.
@@ -137,80 +147,231 @@ class Projected3DROI(QtGui.QGraphicsRectItem, AnnotationItem):
 		self.setRect(QtCore.QRect(x_min, y_min, x_max-x_min, y_max-y_min))
 
 class PointCloudItem(QtGui.QGraphicsItem):
-	def __init__(self, plane, pts, factor):
+	def __init__(self, view, points, colors, factor):
+		"""
+		PointCloudItem constructor
+
+		:param view: Signed axes on which the points are projected
+		             ("+0-1-2" for xy, and so on), or rotation from the
+		             points' frame to the view frame
+		:type view: str or numpy.ndarray
+		:param points: Coordinates of the points, of shape (N, 3)
+		:type points: numpy.ndarray
+		:param colors: BGR colors of the points, of shape (N, 3)
+		:type colors: numpy.ndarray
+		:param factor: Number of scene pixels per meter
+		:type factor: float
+		"""
 		QtGui.QGraphicsItem.__init__(self)
-		self.pts = pts
 		self.factor = factor
+		self.view = planeRotation(view) if isinstance(view, basestring) else view
+		self._pixmap = None
+		self._raster_x = 0
+		self._raster_y = 0
+		self._raster_width = 0
+		self._raster_height = 0
 
-		self.h_sign = -1 if "-" == plane[0] else 1
-		self.h_axis = int(plane[1])
-		self.v_sign = -1 if "-" == plane[2] else 1
-		self.v_axis = int(plane[3])
-		self.z_sign = -1 if "-" == plane[4] else 1
-		self.z_axis = int(plane[5])
-
-		self.x_min = self.h_sign*int(round(self.factor*self.pts[0][0][self.h_axis]))
-		self.y_min = self.v_sign*int(round(self.factor*self.pts[0][0][self.v_axis]))
-		self.x_max = self.h_sign*int(round(self.factor*self.pts[0][0][self.h_axis]))
-		self.y_max = self.v_sign*int(round(self.factor*self.pts[0][0][self.v_axis]))
-		self.pts.sort(
-		    cmp=lambda x,y:cmp(
-		                       self.z_sign * x[0][self.z_axis],
-		                       self.z_sign * y[0][self.z_axis]
-		                      )
-		)
-
-		for pt in self.pts:
-			if self.x_min > self.h_sign*int(round(self.factor*pt[0][self.h_axis])):
-				self.x_min = self.h_sign*int(round(self.factor*pt[0][self.h_axis]))
+		self.setPointCloud(points, colors)
 
-			if self.y_min > self.v_sign*int(round(self.factor*pt[0][self.v_axis])):
-				self.y_min = self.v_sign*int(round(self.factor*pt[0][self.v_axis]))
+	def setPointCloud(self, points, colors, view=None):
+		"""
+		Replace the displayed points
+
+		:param points: Coordinates of the points, of shape (N, 3)
+		:type points: numpy.ndarray
+		:param colors: BGR colors of the points, of shape (N, 3)
+		:type colors: numpy.ndarray
+		:param view: New rotation from the points' frame to the view frame
+		             (optional)
+		:type view: numpy.ndarray
+		"""
+		self.points = points
+		self.colors = colors
+		if view is not None:
+			self.view = view
+		self._render()
 
-			if self.x_max < self.h_sign*int(round(self.factor*pt[0][self.h_axis])):
-				self.x_max = self.h_sign*int(round(self.factor*pt[0][self.h_axis]))
+	def setView(self, view):
+		"""
+		Change the direction from which the points are seen
 
-			if self.y_max < self.v_sign*int(round(self.factor*pt[0][self.v_axis])):
-				self.y_max = self.v_sign*int(round(self.factor*pt[0][self.v_axis]))
+		:param view: Rotation from the points' frame to the view frame
+		:type view: numpy.ndarray
+		"""
+		self.view = view
+		self._render()
 
 	def paint(self, painter, option, widget):
-		for pt in self.pts:
-
-			if len(pt)>1:
-				# Color is BGR, but Qt wants RGB
-				color = QtGui.QColor(
-				                     pt[1][2],
-				                     pt[1][1],
-				                     pt[1][0]
-				                    )
-			else:
-				color = QtGui.QColor(0, 0, 0)
-
-			painter.setBrush(QtGui.QBrush(color))
-			painter.setPen(QtGui.QPen(color, 1))
-			painter.drawRect(
-			    self.h_sign*int(round(self.factor*pt[0][self.h_axis])),
-			    self.v_sign*int(round(self.factor*pt[0][self.v_axis])),
-			    1, 1
-			)
+		if self._pixmap is not None:
+			# The pixmap is stretched when it was rendered at a lower resolution
+			painter.drawPixmap(self.boundingRect(),
+			                   self._pixmap,
+			                   QtCore.QRectF(self._pixmap.rect()))
 
 	def boundingRect(self):
 		return QtCore.QRectF(
-		    self.x_min, self.y_min,
-		    self.x_max - self.x_min,
-		    self.y_max - self.y_min
+		    self._raster_x, self._raster_y,
+		    self._raster_width,
+		    self._raster_height
 		)
 
+	def _render(self):
+		"""
+		Project the points for the current view and scale. The result is kept
+		until one of them changes.
+		"""
+		self.prepareGeometryChange()
+		raster, self._raster_x, self._raster_y, scale = rasterize(
+		    self.points, self.colors, self.view, self.factor
+		)
+		height, width = raster.shape[:2]
+		self._raster_width = width * scale
+		self._raster_height = height * scale
+		self._pixmap = None
+		if width > 0 and height > 0:
+			# BGRA bytes are ARGB32 pixels on little-endian machines
+			self._pixmap = QtGui.QPixmap.fromImage(
+			    QtGui.QImage(raster.tostring(),
+			                 width,
+			                 height,
+			                 4*width,
+			                 QtGui.QImage.Format_ARGB32)
+			)
+		self.update()
+
+class OrbitScene(QtGui.QGraphicsScene):
+	"""
+	Scene showing a point cloud from any direction. Dragging the mouse
+	orbits around the center of the points.
+
+	While the view moves, only a coarse level of the cloud is drawn. Every
+	point is drawn again once the view stays still.
+	"""
+
+	#: Rotation applied per dragged pixel (rad)
+	ORBIT_SPEED = 0.01
+
+	#: Time without motion after which every point is drawn (ms)
+	IDLE_DELAY = 200
+
+	# ───────────
+	# Constructor
+
+	def __init__(self, points, colors, factor, point_budget=DEFAULT_POINT_BUDGET):
+		"""
+		OrbitScene constructor
+
+		:param points: Coordinates of the points, of shape (N, 3)
+		:type points: numpy.ndarray
+		:param colors: BGR colors of the points, of shape (N, 3)
+		:type colors: numpy.ndarray
+		:param factor: Number of scene pixels per meter
+		:type factor: float
+		:param point_budget: Number of points drawn while the view moves
+		:type point_budget: int
+		"""
+		QtGui.QGraphicsScene.__init__(self)
+		self.setBackgroundBrush(QtCore.Qt.lightGray)
+		self.yaw = 0.0
+		self.pitch = 0.0
+		self._point_budget = point_budget
+		self._lod = None
+		self._is_coarse = False
+		self._last_mouse_pos = None
+		self._idle_timer = QtCore.QTimer(self)
+		self._idle_timer.setSingleShot(True)
+		self._idle_timer.setInterval(self.IDLE_DELAY)
+		self._idle_timer.timeout.connect(self._showFullResolution)
+		self._item = PointCloudItem(orbitRotation(self.yaw, self.pitch),
+		                            numpy.zeros((0, 3), dtype=numpy.float32),
+		                            colors[0:0],
+		                            factor)
+		self.addItem(self._item)
+		self.setPointCloud(points, colors)
+
+	# ──────────
+	# Public API
+
+	def setPointCloud(self, points, colors):
+		"""
+		Replace the displayed points
+
+		:param points: Coordinates of the points, of shape (N, 3)
+		:type points: numpy.ndarray
+		:param colors: BGR colors of the points, of shape (N, 3)
+		:type colors: numpy.ndarray
+		"""
+		if len(points) > 0:
+			# Orbit around the center of the points
+			points = points - points.mean(axis=0).astype(points.dtype)
+		self._lod = PointCloudLOD(points, colors, self._point_budget)
+		self._is_coarse = False
+		self._item.setPointCloud(*self._lod.full)
+
+	def setOrientation(self, yaw, pitch):
+		"""
+		Change the direction from which the points are seen
+
+		:param yaw: Rotation around the vertical axis of the points (rad)
+		:type yaw: float
+		:param pitch: Rotation around the horizontal axis of the view (rad)
+		:type pitch: float
+		"""
+		self.yaw = yaw
+		self.pitch = max(-math.pi/2, min(math.pi/2, pitch))
+		view = orbitRotation(self.yaw, self.pitch)
+		if not self._is_coarse:
+			points, colors = self._lod.coarse
+			self._is_coarse = True
+			self._item.setPointCloud(points, colors, view)
+		else:
+			self._item.setView(view)
+		self._idle_timer.start()
+
+	# ───────────
+	# Private API
+
+	def _showFullResolution(self):
+		if self._is_coarse:
+			points, colors = self._lod.full
+			self._is_coarse = False
+			self._item.setPointCloud(points, colors)
+
+	# ─────
+	# Slots
+
+	def mousePressEvent(self, event):
+		self._last_mouse_pos = event.screenPos()
+		event.accept()
+
+	def mouseMoveEvent(self, event):
+		if self._last_mouse_pos is None:
+			return
+		delta = event.screenPos() - self._last_mouse_pos
+		self._last_mouse_pos = event.screenPos()
+		self.setOrientation(self.yaw + self.ORBIT_SPEED * delta.x(),
+		                    self.pitch + self.ORBIT_SPEED * delta.y())
+		event.accept()
+
+	def mouseReleaseEvent(self, event):
+		self._last_mouse_pos = None
+		event.accept()
+
 class Scene3D(object):
 	"""
 	Class to handle several scenes representing different views of the same
 	3D scene (which cannot be directly represented in Qt4).
 	"""
 
-	def __init__(self, parent_widget, pt_cloud):
+	def __init__(self, parent_widget, points, colors,
+	             point_budget=DEFAULT_POINT_BUDGET):
 		self.parent_widget = parent_widget
+		self.point_budget = point_budget
 		self.scenes = dict()
-		self.pt_cloud = pt_cloud
+		self.points = points
+		self.colors = colors
+		self._point_cloud_items = dict()
+		self._orbit_scene = None
 		self._item2handle = dict()
 		self._handle2items = dict()
 
@@ -257,7 +418,7 @@ class Scene3D(object):
 		self.scenes[plane].itemSelected.connect(self.parent_widget.itemSelected)
 
 		# Add the 3D point cloud in it
-		self._add3DPointCloud(plane, self.pt_cloud)
+		self._add3DPointCloud(plane)
 
 		# And add every already created items
 		for _h in self._handle2items:
@@ -267,6 +428,36 @@ class Scene3D(object):
 			self._handle2items[_h].append(item)
 			self.scenes[plane].addItem(item)
 
+	def setPointCloud(self, points, colors):
+		"""
+		Replace the points shown in every projection
+
+		:param points: Coordinates of the points, of shape (N, 3)
+		:type points: numpy.ndarray
+		:param colors: BGR colors of the points, of shape (N, 3)
+		:type colors: numpy.ndarray
+		"""
+		self.points = points
+		self.colors = colors
+		for item in self._point_cloud_items.values():
+			item.setPointCloud(points, colors)
+		if self._orbit_scene is not None:
+			self._orbit_scene.setPointCloud(points, colors)
+
+	def getOrbitScene(self):
+		"""
+		Return the scene showing the points from any direction
+		(annotations are not displayed there)
+
+		:rtype: OrbitScene
+		"""
+		if self._orbit_scene is None:
+			self._orbit_scene = OrbitScene(self.points,
+			                               self.colors,
+			                               self.factor,
+			                               self.point_budget)
+		return self._orbit_scene
+
 	def removeItem(self, item):
 		handle = self._item2handle[item]
 		items = self._handle2items.pop(handle)
@@ -277,8 +468,10 @@ class Scene3D(object):
 	# ───────────
 	# Private API
 
-	def _add3DPointCloud(self, plane, pt_cloud):
-		self.scenes[plane].addItem(PointCloudItem(plane, pt_cloud, self.factor))
+	def _add3DPointCloud(self, plane):
+		item = PointCloudItem(plane, self.points, self.colors, self.factor)
+		self._point_cloud_items[plane] = item
+		self.scenes[plane].addItem(item)
 
 	def _locationToCoordinates(self, location):
 		"""
@@ -310,8 +503,15 @@ class FrameViewer(QtGui.QSplitter):
 	# ───────────
 	# Constructor
 
-	def __init__(self, files, parent=None):
+	def __init__(self, files, parent=None, z_buffer=False, voxel_size=None,
+	             point_budget=DEFAULT_POINT_BUDGET):
 		QtGui.QSplitter.__init__(self, QtCore.Qt.Vertical, parent)
+		# If True, points hidden from a 2D camera do not take its colors
+		self.z_buffer = z_buffer
+		# If set, fused depth images keep one point per voxel of this size (m)
+		self.voxel_size = voxel_size
+		# Number of points drawn while the 3D view moves
+		self.point_budget = point_budget
 		self.transform_to_files_map = dict()
 		self.raw_data_to_files_map = dict()
 		self.type_to_files_map = dict()
@@ -321,32 +521,31 @@ class FrameViewer(QtGui.QSplitter):
 
 		_ref_tf = Transform()
 
-		for file_name in files:
-			with qidata.open(file_name) as qidata_file:
-				self.transform_to_files_map[file_name] = qidata_file.transform
-				self.raw_data_to_files_map[file_name] = qidata_file.raw_data
-				self.files_to_type_map[file_name] = qidata_file.type
-				if not qidata_file.type in self.type_to_files_map.keys():
-					self.type_to_files_map[qidata_file.type] = []
-				self.type_to_files_map[qidata_file.type].append(file_name)
-				self._data_has_tf |= (_ref_tf != qidata_file.transform)
-				self._frame_has_3d |= (DataType.IMAGE_3D == qidata_file.type)
-
+		# Files are read concurrently. Their metadata are read before any of
+		# them is decoded, and tell how the frame is displayed. Raw data are
+		# shown once decoded.
+		self._pending_files = getFileCache().getAllAsync(files)
+		for pending_file in self._pending_files:
+			pending_file.waitForMetadata()
+			file_name = pending_file.path
+			self.transform_to_files_map[file_name] = pending_file.transform
+			self.files_to_type_map[file_name] = pending_file.type
+			if not pending_file.type in self.type_to_files_map.keys():
+				self.type_to_files_map[pending_file.type] = []
+			self.type_to_files_map[pending_file.type].append(file_name)
+			self._data_has_tf |= (_ref_tf != pending_file.transform)
+			self._frame_has_3d |= (DataType.IMAGE_3D == pending_file.type)
 
 		self._column_index = -1
 		self._row_index = -1
-
-		if not self._data_has_tf or not self._frame_has_3d:
-			for file_name in files:
-				self._addWidget(
-				    makeRawDataWidget(
-				        None, # parenting will be set at addition
-				        self.files_to_type_map[file_name],
-				        self.raw_data_to_files_map[file_name]
-				    ),
-				)
-
-		else:
+		self._cells = dict() # file name -> placeholder until it is decoded
+		self._point_cloud_job = None
+		self._loading_timer = QtCore.QTimer(self)
+		self._loading_timer.setInterval(LOADING_POLL_INTERVAL)
+		self._loading_timer.timeout.connect(self._collectLoadedData)
+
+		if self._data_has_tf and self._frame_has_3d:
+			# Otherwise, each file gets its own widget
 			self.viewer_widget = QtGui.QWidget()
 			self._addWidget(self.viewer_widget)
 			self.viewer_layout = QtGui.QVBoxLayout(self)
@@ -398,87 +597,51 @@ class FrameViewer(QtGui.QSplitter):
 			)
 			self.yz_button.clicked.connect(lambda: self._switchAxis("-1-2-0"))
 
+			# "Orbit" button
+			self.orbit_button = QtGui.QPushButton("3D", self.buttons_widget)
+			self.orbit_button.setFixedSize(
+			    fit_ic.actualSize(
+			        fit_ic.availableSizes()[0]
+			    )
+			)
+			self.orbit_button.setToolTip("Drag the mouse to turn around the points")
+			self.orbit_button.clicked.connect(self._showOrbitView)
+
 			# Aggregation
 			self.top_layout = QtGui.QHBoxLayout(self)
 			self.top_layout.addWidget(self.fit_button)
 			self.top_layout.addWidget(self.xy_button)
 			self.top_layout.addWidget(self.xz_button)
 			self.top_layout.addWidget(self.yz_button)
+			self.top_layout.addWidget(self.orbit_button)
 			self.buttons_widget.setLayout(self.top_layout)
 
 			self.view = QtGui.QGraphicsView(self)
 			self.viewer_layout.addWidget(self.view)
 
-			self.pts_3d = []
-			for file_name in self.type_to_files_map[DataType.IMAGE_3D]:
-				img = Image(file_name)
-				pts = [[[a,b]] for b in range(0,img.height) for a in range(0,img.width)]
-				# pts = [
-				#          [[0,0]], [[1,0]], .., [[W-1,0]],
-				#          [[0,1]],     ....,    [[W-1,1]],
-				#                       ....,             ,
-				#          ...                 [[W-1,H-1]]
-				#       ]
-
-				tmp_3d = cv2.undistortPoints(
-				             numpy.array(pts,dtype=numpy.float32),
-				             numpy.array(img.camera_info.camera_matrix),
-				             numpy.array(img.camera_info.distortion_coeffs),
-				         )
-
-				h = img.height
-				w = img.width
-				tmp_3d = tmp_3d.reshape((h, w, 2))
-				img_data = img.numpy_image
-				tmp_3d = numpy.multiply(tmp_3d,img_data)
-				tmp_3d = numpy.append(tmp_3d,img_data, axis=2)
-				tmp_3d /= 1000.0
-				tmp_3d = numpy.append(tmp_3d, numpy.ones((h,w,1)), axis=2)
-
-				tmp_3d = numpy.transpose(tmp_3d, (2,1,0))
-				tmp_3d = numpy.reshape(tmp_3d, (4,h*w))
-				# Remove 0 distance points
-				tmp_3d = tmp_3d[:,numpy.where(tmp_3d[2,:])[0]]
-
-				with qidata.open(file_name) as qidata_image:
-					t = transform_matrix(qidata_image.transform)
-				pts_3d_world = numpy.dot(t, tmp_3d)
-
-			color = [[0,0,0]]*h*w
-
-			for file_name in self.type_to_files_map[DataType.IMAGE_2D]:
-				img = Image(file_name)
-				with qidata.open(file_name) as qidata_image:
-					t = transform_matrix(qidata_image.transform)
-					t_inv = numpy.linalg.inv(t)
-
-				img_rendered = img.render() # Make sure it is BGR
-				m1, m2 = cv2.initUndistortRectifyMap(
-				    numpy.array(img.camera_info.camera_matrix),
-				    numpy.array(img.camera_info.distortion_coeffs),
-				    None,
-				    numpy.array(img.camera_info.camera_matrix),
-				    (img.width, img.height),
-				    cv2.CV_32FC1
-				)
-				img_rendered_undistort = cv2.remap(img_rendered.numpy_image,m1,m2,cv2.INTER_LINEAR)
-
-				pts_3d_in_cam_frame = numpy.dot(t_inv, pts_3d_world)
-				pts_3d_in_cam_plane = numpy.dot(numpy.array(img.camera_info.camera_matrix), pts_3d_in_cam_frame[0:3])
-				pts_2d_in_cam_plane = numpy.divide(pts_3d_in_cam_plane[0:2], pts_3d_in_cam_plane[2])
-				pts_2d_in_image = pts_2d_in_cam_plane.astype(int)
-
-				for i in range(pts_2d_in_image.shape[1]):
-					x = int(pts_2d_in_image[0][i])
-					y = int(pts_2d_in_image[1][i])
-					if x>=0 and x<img.width and y>=0 and y<img.height:
-						color[i] = img_rendered_undistort[y][x].tolist()
+			# The point cloud is built in background and shown once ready
+			self.pts_3d = numpy.zeros((0, 3), dtype=numpy.float32)
+			self.pts_colors = numpy.zeros((0, 3), dtype=numpy.uint8)
+			self.scene = Scene3D(self, self.pts_3d, self.pts_colors, self.point_budget)
 
-			self.pts_3d = numpy.transpose(pts_3d_world).tolist()
-			self.pts_3d = zip(self.pts_3d, color)
-			self.scene = Scene3D(self, self.pts_3d)
+			self.progress_bar = QtGui.QProgressBar(self)
+			self.progress_bar.setRange(0, 100)
+			self.progress_bar.setFormat("Loading files... %p%")
+			self.viewer_layout.addWidget(self.progress_bar)
 
 			self._switchAxis("-1-2-0")
+		else:
+			# Cells are reserved in the order of the files, so that the layout
+			# does not depend on which file is decoded first
+			for file_name in files:
+				placeholder = QtGui.QLabel("Loading...")
+				placeholder.setAlignment(QtCore.Qt.AlignCenter)
+				self._cells[file_name] = placeholder
+				self._addWidget(placeholder)
+
+		self._collectLoadedData()
+		if not self.isReady():
+			self._loading_timer.start()
 
 	# ──────────
 	# Decorators
@@ -508,13 +671,26 @@ class FrameViewer(QtGui.QSplitter):
 	def addItem(self, location, info):
 		self.scene.addItem(location, info)
 
+	def isReady(self):
+		"""
+		Tell if every file of the frame is displayed, including the point
+		cloud of a frame shown in 3D
+		"""
+		if len(self._pending_files) > 0:
+			return False
+		if not self._data_has_tf or not self._frame_has_3d:
+			return True
+		return self._point_cloud_job is not None\
+		       and self._point_cloud_job.isDone()\
+		       and not self._loading_timer.isActive()
+
 	@skip_if_not_3d
 	def removeItem(self, item):
 		self.scene.removeItem(item)
 
 	@skip_if_not_3d
 	def selectItem(self, item):
-		self.view.scene().selectItem(item)
+		self.scene[self.plane].selectItem(item)
 
 	def deselectAll(self):
 		"""
@@ -524,7 +700,7 @@ class FrameViewer(QtGui.QSplitter):
 
 	@skip_if_not_3d
 	def focusOutSelectedItem(self):
-		self.view.scene().focusOutSelectedItem()
+		self.scene[self.plane].focusOutSelectedItem()
 
 	@skip_if_not_3d
 	def clearAllItems(self):
@@ -561,43 +737,123 @@ class FrameViewer(QtGui.QSplitter):
 		current_row_widget = self.widget(self._row_index)
 		current_row_widget.addWidget(widget)
 
+	def _fillCell(self, file_name, widget):
+		"""
+		Replace the placeholder of the cell reserved for a file
+
+		:param file_name: File displayed by the widget
+		:type file_name: str
+		:param widget: Widget displaying the file
+		:type widget: QtGui.QWidget
+		"""
+		placeholder = self._cells.pop(file_name)
+		row_widget = placeholder.parentWidget()
+		row_widget.insertWidget(row_widget.indexOf(placeholder), widget)
+		placeholder.setParent(None)
+		placeholder.deleteLater()
+
 	def _fitContentToWindow(self):
 		self.view.fitInView(self.view.scene().sceneRect(),
 			                QtCore.Qt.KeepAspectRatio)
 
+	def _collectLoadedData(self):
+		"""
+		Show the files decoded in background, then the point cloud of a frame
+		shown in 3D once it is built
+		"""
+		is_3d = self._data_has_tf and self._frame_has_3d
+		for pending_file in list(self._pending_files):
+			if not pending_file.isReady():
+				continue
+			self._pending_files.remove(pending_file)
+			try:
+				loaded_file = pending_file.get()
+			except Exception as e:
+				# The file is left out of the frame
+				if not is_3d:
+					error_cell = QtGui.QLabel(
+					    "Could not read %s:\n%s"%(
+					        os.path.basename(pending_file.path),
+					        e
+					    )
+					)
+					error_cell.setAlignment(QtCore.Qt.AlignCenter)
+					self._fillCell(pending_file.path, error_cell)
+				continue
+			self.raw_data_to_files_map[loaded_file.path] = loaded_file.raw_data
+			if not is_3d:
+				self._fillCell(
+				    loaded_file.path,
+				    makeRawDataWidget(
+				        None, # parenting will be set at addition
+				        loaded_file.type,
+				        loaded_file.raw_data
+				    ),
+				)
+
+		if not is_3d:
+			if len(self._pending_files) == 0:
+				self._loading_timer.stop()
+			return
+
+		if len(self._pending_files) > 0:
+			file_count = len(self.files_to_type_map)
+			self.progress_bar.setValue(
+			    100*(file_count - len(self._pending_files)) / file_count
+			)
+			return
+
+		if self._point_cloud_job is None:
+			self._point_cloud_job = PointCloudJob(
+			    [
+			        (
+			            self.raw_data_to_files_map[f],
+			            transform_matrix(self.transform_to_files_map[f])
+			        )
+			        for f in self.type_to_files_map[DataType.IMAGE_3D]
+			        if f in self.raw_data_to_files_map
+			    ],
+			    [
+			        (
+			            self.raw_data_to_files_map[f],
+			            transform_matrix(self.transform_to_files_map[f])
+			        )
+			        for f in self.type_to_files_map.get(DataType.IMAGE_2D, [])
+			        if f in self.raw_data_to_files_map
+			    ],
+			    self.z_buffer,
+			    self.voxel_size
+			)
+			self._point_cloud_job.start()
+			self.progress_bar.setFormat("Building point cloud... %p%")
+
+		job = self._point_cloud_job
+		if not job.isDone():
+			self.progress_bar.setValue(int(100*job.progress))
+			return
+		self._loading_timer.stop()
+		self.progress_bar.hide()
+		result = job.get()
+		if result is None:
+			# Cancelled
+			return
+		self.pts_3d, self.pts_colors = result
+		self.scene.setPointCloud(self.pts_3d, self.pts_colors)
+
+	def _showOrbitView(self):
+		# The selected annotation stays on its plane, where it is edited
+		self.view.setScene(self.scene.getOrbitScene())
+
 	def _switchAxis(self, plane):
 		self.scene[plane].refreshItems()
 		self.view.setScene(self.scene[plane])
 		self.plane = plane
 
-_EPS = numpy.finfo(float).eps * 4.0
+	# ─────
+	# Slots
 
-def transform_matrix(transform_struct):
-	"""Return homogeneous rotation matrix from quaternion.
-
-	>>> M = quaternion_matrix([0.99810947, 0.06146124, 0, 0])
-	>>> numpy.allclose(M, rotation_matrix(0.123, [1, 0, 0]))
-	True
-	>>> M = quaternion_matrix([1, 0, 0, 0])
-	>>> numpy.allclose(M, numpy.identity(4))
-	True
-	>>> M = quaternion_matrix([0, 1, 0, 0])
-	>>> numpy.allclose(M, numpy.diag([1, -1, -1, 1]))
-	True
-
-	"""
-	quaternion = transform_struct.rotation
-	trans = transform_struct.translation
-	quat = [quaternion.x, quaternion.y, quaternion.z, quaternion.w]
-	q = numpy.array(quat, dtype=numpy.float64, copy=True)
-	n = numpy.dot(q, q)
-	if n < _EPS:
-	    return numpy.identity(4)
-	q *= math.sqrt(2.0 / n)
-	q = numpy.outer(q, q)
-	return numpy.array([
-	    [1.0-q[2, 2]-q[3, 3],     q[1, 2]-q[3, 0],     q[1, 3]+q[2, 0], trans.x],
-	    [    q[1, 2]+q[3, 0], 1.0-q[1, 1]-q[3, 3],     q[2, 3]-q[1, 0], trans.y],
-	    [    q[1, 3]-q[2, 0],     q[2, 3]+q[1, 0], 1.0-q[1, 1]-q[2, 2], trans.z],
-	    [                0.0,                 0.0,                 0.0,     1.0]
-	])
\ No newline at end of file
+	def closeEvent(self, event):
+		self._loading_timer.stop()
+		if self._point_cloud_job is not None:
+			self._point_cloud_job.cancel()
+		QtGui.QSplitter.closeEvent(self, event)
@@ -0,0 +1,589 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Computation of point clouds from depth images
+"""
+
+# Standard libraries
+import math
+from multiprocessing.pool import ThreadPool
+
+# Third-party libraries
+import cv2
+import numpy
+
+# Local modules
+from .calibration_cache import getCalibrationCache
+
+def getRayGrid(camera_matrix, distortion_coeffs, width, height):
+	"""
+	Return the undistorted, normalized ray (x/z, y/z) seen by each pixel of
+	a camera. The grid is computed once per calibration (see
+	:class:`.calibration_cache.CalibrationCache`).
+
+	:param camera_matrix: Intrinsic matrix of the camera
+	:type camera_matrix: list
+	:param distortion_coeffs: Distortion coefficients of the camera
+	:type distortion_coeffs: list
+	:param width: Width of the images
+	:type width: int
+	:param height: Height of the images
+	:type height: int
+	:return: Array of shape (height, width, 2)
+	:rtype: numpy.ndarray
+	"""
+	return getCalibrationCache().getRayGrid(camera_matrix,
+	                                        distortion_coeffs,
+	                                        width,
+	                                        height)
+
+def undistort(image, camera_matrix, distortion_coeffs):
+	"""
+	Remove the distortion of an image, keeping the same camera matrix.
+
+	:param image: Image to undistort
+	:type image: numpy.ndarray
+	:param camera_matrix: Intrinsic matrix of the camera
+	:type camera_matrix: list
+	:param distortion_coeffs: Distortion coefficients of the camera
+	:type distortion_coeffs: list
+	:rtype: numpy.ndarray
+	"""
+	height, width = image.shape[:2]
+	m1, m2 = getCalibrationCache().getUndistortionMaps(camera_matrix,
+	                                                   distortion_coeffs,
+	                                                   width,
+	                                                   height)
+	return cv2.remap(image, m1, m2, cv2.INTER_LINEAR)
+
+def backProject(depth, ray_grid, depth_scale=0.001):
+	"""
+	Compute the points seen by a depth camera, in the camera frame. Pixels
+	without depth are ignored.
+
+	:param depth: Depth image
+	:type depth: numpy.ndarray
+	:param ray_grid: Normalized ray of each pixel (see :func:`getRayGrid`)
+	:type ray_grid: numpy.ndarray
+	:param depth_scale: Size of a depth unit, in meters
+	:type depth_scale: float
+	:return: Homogeneous coordinates of the points, of shape (4, N)
+	:rtype: numpy.ndarray
+	"""
+	depth = depth.reshape(ray_grid.shape[:2])
+	has_depth = depth != 0
+	z = depth[has_depth].astype(numpy.float64) * depth_scale
+	rays = ray_grid[has_depth]
+	return numpy.vstack((rays[:, 0] * z, rays[:, 1] * z, z, numpy.ones_like(z)))
+
+def colorize(points, image, camera_matrix, transform, colors=None,
+             z_buffer=False, z_tolerance=0.02):
+	"""
+	Color points with the pixels of the camera image they project into.
+	Points projecting outside of the image keep their current color.
+
+	:param points: Homogeneous coordinates of the points, of shape (4, N)
+	:type points: numpy.ndarray
+	:param image: Undistorted BGR image
+	:type image: numpy.ndarray
+	:param camera_matrix: Intrinsic matrix of the camera
+	:type camera_matrix: list
+	:param transform: Pose of the camera, in the points' frame
+	:type transform: numpy.ndarray
+	:param colors: BGR colors to update, of shape (N, 3). Black if None.
+	:type colors: numpy.ndarray
+	:param z_buffer: If True, only points at most ``z_tolerance`` behind the
+	closest point seen by a pixel take its color
+	:type z_buffer: bool
+	:param z_tolerance: Depth tolerance of the z-buffer, in meters
+	:type z_tolerance: float
+	:return: Colors of the points, as uint8 array of shape (N, 3)
+	:rtype: numpy.ndarray
+	"""
+	if colors is None:
+		colors = numpy.zeros((points.shape[1], 3), dtype=numpy.uint8)
+	in_camera = numpy.dot(numpy.linalg.inv(transform), points)[0:3]
+	projected = numpy.dot(numpy.array(camera_matrix, dtype=numpy.float64),
+	                      in_camera)
+	indexes = numpy.flatnonzero(projected[2] > 0)
+	zs = projected[2, indexes]
+	xs = numpy.floor(projected[0, indexes] / zs).astype(numpy.intp)
+	ys = numpy.floor(projected[1, indexes] / zs).astype(numpy.intp)
+
+	height, width = image.shape[:2]
+	in_image = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+	indexes = indexes[in_image]
+	xs = xs[in_image]
+	ys = ys[in_image]
+
+	if z_buffer:
+		zs = zs[in_image]
+		pixels = ys * width + xs
+		closest = _frontPerPixel(pixels, -zs)
+		depth_buffer = numpy.empty(height * width)
+		depth_buffer[pixels[closest]] = zs[closest]
+		visible = zs <= depth_buffer[pixels] + z_tolerance
+		indexes = indexes[visible]
+		xs = xs[visible]
+		ys = ys[visible]
+
+	colors[indexes] = image[ys, xs]
+	return colors
+
+def voxelFilter(points, voxel_size):
+	"""
+	Select one point per voxel of a regular grid.
+
+	:param points: Coordinates of the points, of shape (3, N) or (4, N)
+	:type points: numpy.ndarray
+	:param voxel_size: Edge of the voxels, in the points' unit
+	:type voxel_size: float
+	:return: Sorted indexes of the first point of each occupied voxel
+	:rtype: numpy.ndarray
+	"""
+	if points.shape[1] == 0:
+		return numpy.arange(0)
+	voxels = numpy.floor(points[0:3] / float(voxel_size)).astype(numpy.int64)
+	voxels -= voxels.min(axis=1)[:, numpy.newaxis]
+	sizes = voxels.max(axis=1) + 1
+	keys = (voxels[0] * sizes[1] + voxels[1]) * sizes[2] + voxels[2]
+	_, indexes = numpy.unique(keys, return_index=True)
+	indexes.sort()
+	return indexes
+
+def fuse(clouds, voxel_size=None):
+	"""
+	Merge point clouds expressed in the same frame.
+
+	:param clouds: Homogeneous coordinates of each cloud, of shape (4, N_i)
+	:type clouds: list
+	:param voxel_size: If given, keep one point per voxel of this size
+	:type voxel_size: float
+	:return: Homogeneous coordinates of the merged cloud, of shape (4, N)
+	:rtype: numpy.ndarray
+	"""
+	if len(clouds) == 0:
+		return numpy.zeros((4, 0))
+	points = numpy.hstack(clouds)
+	if voxel_size is not None:
+		points = points[:, voxelFilter(points, voxel_size)]
+	return points
+
+#: Default number of points drawn while a view is moving
+DEFAULT_POINT_BUDGET = 50000
+
+def randomSubsample(count, budget, seed=0):
+	"""
+	Select a uniform random subset of points, like reservoir sampling but in
+	a single vectorized pass: each point draws a random key, and the points
+	with the ``budget`` smallest keys are kept.
+
+	:param count: Number of points
+	:type count: int
+	:param budget: Maximum number of points to keep
+	:type budget: int
+	:param seed: Seed of the random keys, so that a cloud always gives the
+	same subset
+	:type seed: int
+	:return: Sorted indexes of the kept points
+	:rtype: numpy.ndarray
+	"""
+	if count <= budget:
+		return numpy.arange(count)
+	keys = numpy.random.RandomState(seed).random_sample(count)
+	indexes = numpy.argpartition(keys, budget)[:budget]
+	indexes.sort()
+	return indexes
+
+def downsample(points, budget):
+	"""
+	Select at most ``budget`` points evenly spread in space, keeping one
+	point per voxel of a grid coarse enough.
+
+	:param points: Coordinates of the points, of shape (N, 3)
+	:type points: numpy.ndarray
+	:param budget: Maximum number of points to keep
+	:type budget: int
+	:return: Sorted indexes of the kept points
+	:rtype: numpy.ndarray
+	"""
+	if len(points) <= budget:
+		return numpy.arange(len(points))
+	# Bound the cost of the voxel grid on very large clouds
+	indexes = randomSubsample(len(points), 8*budget)
+	candidates = points[indexes].T
+
+	# Points mostly lie on surfaces: start with a grid having about
+	# ``budget`` cells on the largest side of their bounding box
+	extent = numpy.sort(candidates.max(axis=1) - candidates.min(axis=1))
+	voxel_size = max(math.sqrt(extent[2] * extent[1] / budget),
+	                 extent[2] / budget,
+	                 1e-6)
+	kept = voxelFilter(candidates, voxel_size)
+	while len(kept) > budget:
+		voxel_size *= max(1.1, math.sqrt(float(len(kept)) / budget))
+		kept = voxelFilter(candidates, voxel_size)
+	return indexes[kept]
+
+class PointCloudLOD(object):
+	"""
+	Levels of detail of a point cloud: the full cloud, and a coarse one
+	bounded by a point budget, to be drawn while the view is moving.
+	"""
+
+	def __init__(self, points, colors, budget=DEFAULT_POINT_BUDGET):
+		"""
+		PointCloudLOD constructor
+
+		:param points: Coordinates of the points, of shape (N, 3)
+		:type points: numpy.ndarray
+		:param colors: BGR colors of the points, of shape (N, 3)
+		:type colors: numpy.ndarray
+		:param budget: Maximum number of points of the coarse level
+		:type budget: int
+		"""
+		self.points = points
+		self.colors = colors
+		self._budget = budget
+		self._coarse = None
+
+	@property
+	def budget(self):
+		return self._budget
+
+	@budget.setter
+	def budget(self, new_budget):
+		if new_budget != self._budget:
+			self._budget = new_budget
+			self._coarse = None
+
+	@property
+	def full(self):
+		"""
+		Every point, as (points, colors)
+		"""
+		return self.points, self.colors
+
+	@property
+	def coarse(self):
+		"""
+		At most ``budget`` points, as (points, colors). Computed once.
+		"""
+		if self._coarse is None:
+			indexes = downsample(self.points, self._budget)
+			self._coarse = (self.points[indexes], self.colors[indexes])
+		return self._coarse
+
+def planeRotation(plane):
+	"""
+	Return the rotation from the points' frame to the frame of a projection
+	on one of their planes
+
+	:param plane: Signed axes of the projection, horizontal, vertical and
+	toward the viewer ("+0-1-2" for xy, and so on)
+	:type plane: str
+	:return: Rotation matrix, whose rows are the horizontal, vertical and
+	toward the viewer axes
+	:rtype: numpy.ndarray
+	"""
+	rotation = numpy.zeros((3, 3))
+	for row in range(3):
+		sign = -1 if "-" == plane[2*row] else 1
+		rotation[row, int(plane[2*row+1])] = sign
+	return rotation
+
+def orbitRotation(yaw, pitch, plane="-1-2-0"):
+	"""
+	Return the rotation of a view orbiting around the points
+
+	:param yaw: Rotation around the vertical axis of the points' frame, in
+	radians
+	:type yaw: float
+	:param pitch: Rotation around the horizontal axis of the view, in radians
+	:type pitch: float
+	:param plane: Projection seen when yaw and pitch are null
+	:type plane: str
+	:rtype: numpy.ndarray
+	"""
+	c, s = math.cos(yaw), math.sin(yaw)
+	yaw_rotation = numpy.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+	c, s = math.cos(pitch), math.sin(pitch)
+	pitch_rotation = numpy.array([[1, 0, 0], [0, c, -s], [0, s, c]])
+	return numpy.dot(pitch_rotation,
+	                 numpy.dot(planeRotation(plane), yaw_rotation))
+
+#: Largest width and height of a rasterized point cloud, in pixels
+MAX_RASTER_SIZE = 4096
+
+def rasterize(points, colors, view, factor):
+	"""
+	Project points on a plane. When several points fall in the same pixel,
+	the one closest to the viewer wins.
+
+	The image is at most :data:`MAX_RASTER_SIZE` pixels wide and high. When
+	the points spread further, each pixel of the image covers several
+	pixels of the projection, so that every point is still drawn.
+
+	:param points: Coordinates of the points, of shape (N, 3) or more columns
+	:type points: numpy.ndarray
+	:param colors: BGR colors of the points, of shape (N, 3)
+	:type colors: numpy.ndarray
+	:param view: Signed axes of the projection (see :func:`planeRotation`),
+	or rotation from the points' frame to the view frame
+	:type view: str or numpy.ndarray
+	:param factor: Number of pixels per unit of the points
+	:type factor: float
+	:return: BGRA image of shape (height, width, 4), the position of its
+	top-left pixel, and the number of projection pixels covered by each
+	of its pixels in each direction
+	:rtype: tuple
+	"""
+	if isinstance(view, basestring):
+		view = planeRotation(view)
+	if len(points) == 0:
+		return numpy.zeros((0, 0, 4), dtype=numpy.uint8), 0, 0, 1
+
+	# Scale in the same product, so that it costs a single pass on the points
+	projected = numpy.dot(points[:, 0:3],
+	                      (view * [[factor], [factor], [1]]).T.astype(points.dtype))
+	extent = max(numpy.ptp(projected[:, 0]), numpy.ptp(projected[:, 1]))
+	scale = 1
+	if extent + 1 > MAX_RASTER_SIZE:
+		# Lower the resolution until the image is small enough
+		scale = int(numpy.ceil((extent + 1) / (MAX_RASTER_SIZE - 1)))
+		projected[:, 0:2] /= scale
+	xs = numpy.round(projected[:, 0]).astype(numpy.int64)
+	ys = numpy.round(projected[:, 1]).astype(numpy.int64)
+	x_min = int(xs.min())
+	y_min = int(ys.min())
+	width = int(xs.max()) - x_min + 1
+	height = int(ys.max()) - y_min + 1
+	pixels = (ys - y_min) * width + (xs - x_min)
+	front = _frontPerPixel(pixels, projected[:, 2])
+
+	image = numpy.zeros((height * width, 4), dtype=numpy.uint8)
+	image[pixels[front], 0:3] = colors[front]
+	image[pixels[front], 3] = 255
+	return image.reshape((height, width, 4)), x_min*scale, y_min*scale, scale
+
+#: Precision of the depth ordering of the points of a same pixel
+DEPTH_BITS = 20
+
+def _frontPerPixel(pixels, depths):
+	"""
+	Select, for each pixel, the point with the highest depth value
+
+	:param pixels: Pixel index of each point
+	:type pixels: numpy.ndarray
+	:param depths: Depth of each point, higher meaning closer to the viewer
+	:type depths: numpy.ndarray
+	:return: Indexes of the selected points, one per occupied pixel
+	:rtype: numpy.ndarray
+	"""
+	if len(pixels) == 0:
+		return numpy.arange(0)
+	# Sort on a single key holding the pixel and the quantized depth, which
+	# is several times faster than sorting on both
+	depths = numpy.asarray(depths, dtype=numpy.float64)
+	depth_min = depths.min()
+	depth_span = depths.max() - depth_min
+	if depth_span > 0:
+		ranks = ((depths - depth_min) * (((1 << DEPTH_BITS) - 1) / depth_span))
+	else:
+		ranks = numpy.zeros(len(depths))
+	keys = (pixels.astype(numpy.int64) << DEPTH_BITS) | ranks.astype(numpy.int64)
+	order = numpy.argsort(keys)
+	sorted_pixels = pixels[order]
+	is_last = numpy.ones(len(order), dtype=bool)
+	is_last[:-1] = sorted_pixels[1:] != sorted_pixels[:-1]
+	return order[is_last]
+
+class PointCloudJob(object):
+	"""
+	Build the colored point cloud of a frame in a background thread.
+
+	Jobs run one at a time, in a thread shared by all jobs. Their owner
+	cancels them once their frame is not displayed anymore, so that they do
+	not delay the jobs of other frames.
+	"""
+
+	#: Thread running the jobs, created when first needed
+	_pool = None
+
+	# ───────────
+	# Constructor
+
+	def __init__(self, depth_images, color_images, z_buffer=False, voxel_size=None):
+		"""
+		PointCloudJob constructor
+
+		:param depth_images: Depth images, as (image, pose matrix) pairs
+		:type depth_images: list
+		:param color_images: Color images, as (image, pose matrix) pairs
+		:type color_images: list
+		:param z_buffer: If True, points hidden from a color camera do not
+		take its colors (see :func:`colorize`)
+		:type z_buffer: bool
+		:param voxel_size: If given, keep one point per voxel of this size,
+		in meters (see :func:`fuse`)
+		:type voxel_size: float
+		"""
+		self._depth_images = depth_images
+		self._color_images = color_images
+		self._z_buffer = z_buffer
+		self._voxel_size = voxel_size
+		self._step_count = len(depth_images) + len(color_images)
+		self._done_steps = 0
+		self._cancelled = False
+		self._result = None
+
+	# ──────────
+	# Properties
+
+	@property
+	def progress(self):
+		"""
+		Fraction of the images already processed
+		"""
+		if self._step_count == 0:
+			return 1.0
+		return float(self._done_steps) / self._step_count
+
+	# ──────────
+	# Public API
+
+	def start(self):
+		"""
+		Start building the point cloud
+		"""
+		if PointCloudJob._pool is None:
+			PointCloudJob._pool = ThreadPool(1)
+		self._result = PointCloudJob._pool.apply_async(self._run)
+
+	def cancel(self):
+		"""
+		Stop building the point cloud at the next image
+		"""
+		self._cancelled = True
+
+	def isCancelled(self):
+		return self._cancelled
+
+	def isDone(self):
+		"""
+		Tell if the job is finished, cancelled or failed
+		"""
+		return self._result is not None and self._result.ready()
+
+	def get(self):
+		"""
+		Return the result of a finished job. Errors raised while building the
+		point cloud are raised again here.
+
+		:return: Coordinates of the points in the world frame (N, 3) and their
+		BGR colors (N, 3), or None if the job was cancelled
+		:rtype: tuple
+		"""
+		return self._result.get()
+
+	# ───────────
+	# Private API
+
+	def _run(self):
+		"""
+		Build the point cloud (runs in the worker thread)
+		"""
+		clouds = []
+		for img, transform in self._depth_images:
+			if self._cancelled:
+				return None
+			ray_grid = getRayGrid(img.camera_info.camera_matrix,
+			                      img.camera_info.distortion_coeffs,
+			                      img.width,
+			                      img.height)
+			# Depth is in mm, points are in m
+			points = backProject(img.numpy_image, ray_grid, 0.001)
+			clouds.append(numpy.dot(transform, points))
+			self._done_steps += 1
+
+		points = fuse(clouds, self._voxel_size)
+		colors = numpy.zeros((points.shape[1], 3), dtype=numpy.uint8)
+
+		for img, transform in self._color_images:
+			if self._cancelled:
+				return None
+			img_rendered = img.render() # Make sure it is BGR
+			img_rendered_undistort = undistort(img_rendered.numpy_image,
+			                                   img.camera_info.camera_matrix,
+			                                   img.camera_info.distortion_coeffs)
+
+			colorize(points,
+			         img_rendered_undistort,
+			         img.camera_info.camera_matrix,
+			         transform,
+			         colors,
+			         z_buffer=self._z_buffer)
+			self._done_steps += 1
+
+		points = numpy.ascontiguousarray(points[0:3].T, dtype=numpy.float32)
+		return points, colors
+
+_EPS = numpy.finfo(float).eps * 4.0
+
+def transform_matrix(transform_struct):
+	"""Return homogeneous rotation matrix from quaternion.
+
+	>>> M = quaternion_matrix([0.99810947, 0.06146124, 0, 0])
+	>>> numpy.allclose(M, rotation_matrix(0.123, [1, 0, 0]))
+	True
+	>>> M = quaternion_matrix([1, 0, 0, 0])
+	>>> numpy.allclose(M, numpy.identity(4))
+	True
+	>>> M = quaternion_matrix([0, 1, 0, 0])
+	>>> numpy.allclose(M, numpy.diag([1, -1, -1, 1]))
+	True
+
+	"""
+	quaternion = transform_struct.rotation
+	trans = transform_struct.translation
+	quat = [quaternion.x, quaternion.y, quaternion.z, quaternion.w]
+	q = numpy.array(quat, dtype=numpy.float64, copy=True)
+	n = numpy.dot(q, q)
+	if n < _EPS:
+	    return numpy.identity(4)
+	q *= math.sqrt(2.0 / n)
+	q = numpy.outer(q, q)
+	return numpy.array([
+	    [1.0-q[2, 2]-q[3, 3],     q[1, 2]-q[3, 0],     q[1, 3]+q[2, 0], trans.x],
+	    [    q[1, 2]+q[3, 0], 1.0-q[1, 1]-q[3, 3],     q[2, 3]-q[1, 0], trans.y],
+	    [    q[1, 3]-q[2, 0],     q[2, 3]+q[1, 0], 1.0-q[1, 1]-q[2, 2], trans.z],
+	    [                0.0,                 0.0,                 0.0,     1.0]
+	])
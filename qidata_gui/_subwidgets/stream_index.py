@@ -0,0 +1,823 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Standard libraries
+import math
+
+# Third-party libraries
+import numpy
+
+#: Number of nanoseconds in a second, stamps being stored in nanoseconds
+NSEC_PER_SEC = 1000000000
+
+#: Maximum number of buckets in the finest level of a density pyramid
+PYRAMID_MAX_BUCKETS = 2**16
+
+#: Default percentiles reported for the jitter of a stream
+JITTER_PERCENTILES = (50, 90, 99)
+
+def toStamps(keys):
+	"""
+	Convert (sec, nsec) timestamps to nanoseconds
+
+	:param keys: Timestamps
+	:type keys: list
+	:rtype: numpy.ndarray
+	"""
+	keys = numpy.array(keys, dtype=numpy.int64).reshape(-1, 2)
+	return keys[:, 0] * NSEC_PER_SEC + keys[:, 1]
+
+def findNewMessages(streams, cursors):
+	"""
+	Find the messages of growing streams which were recorded after given
+	cursors.
+
+	This function only reads its inputs, so that it can be called from a
+	background thread while the indexes are used.
+
+	:param streams: Map from stream names to maps from timestamps to file
+	                names
+	:type streams: dict
+	:param cursors: Map from stream names to the number of messages already
+	                indexed and the stamp of the most recent one
+	:type cursors: dict
+	:return: Map from stream names to their new messages, and map from
+	         stream names to streams which must be indexed again because
+	         messages were removed or inserted in the past
+	:rtype: tuple
+	"""
+	new_messages = dict()
+	rebuilt_streams = dict()
+	for (stream_name, stream) in streams.items():
+		count, last_stamp = cursors.get(stream_name, (0, None))
+		if count == len(stream):
+			continue
+		if count == 0:
+			new_messages[stream_name] = stream
+			continue
+		last_key = divmod(int(last_stamp), NSEC_PER_SEC)
+		new_keys = [key for key in stream if key > last_key]
+		if count + len(new_keys) == len(stream):
+			new_messages[stream_name] = dict(
+			    [(key, stream[key]) for key in new_keys]
+			)
+		else:
+			rebuilt_streams[stream_name] = stream
+	return (new_messages, rebuilt_streams)
+
+class _ArrayBuffer(object):
+	"""
+	One-dimensional array whose end can be extended or rewritten in place.
+
+	Storage grows geometrically, so that appending values costs a time
+	proportional to the number of new values.
+	"""
+
+	def __init__(self, values):
+		self._data = numpy.asarray(values)
+		self._length = len(self._data)
+
+	@property
+	def values(self):
+		return self._data[:self._length]
+
+	def append(self, values):
+		"""
+		Add values at the end of the array
+
+		:param values: Values to add
+		:type values: numpy.ndarray
+		"""
+		self.replaceTail(self._length, values)
+
+	def replaceTail(self, start, values):
+		"""
+		Replace all values from a given position by new ones
+
+		:param start: Position of the first replaced value
+		:type start: int
+		:param values: New values
+		:type values: numpy.ndarray
+		"""
+		end = start + len(values)
+		if end > len(self._data):
+			data = numpy.empty(max(end, 2*len(self._data)), dtype=self._data.dtype)
+			data[:start] = self._data[:start]
+			self._data = data
+		self._data[start:end] = values
+		self._length = end
+
+class StreamIndex(object):
+	"""
+	Sorted, array-backed index of the timestamps of one stream.
+
+	The stream dictionary is read once at construction. Timestamps are kept
+	sorted in a contiguous array of integer nanoseconds, so that lookups are
+	exact and done by binary search instead of sorting the stream keys on
+	each query. File names are kept in a parallel list.
+
+	A density pyramid (number of stamps per time bucket, each level having
+	buckets twice as long as the previous one) is built on first use. It
+	allows to compute the stamp density over a time window in a time
+	proportional to the requested resolution instead of the stream length.
+
+	Messages recorded after the construction can be appended, for a cost
+	depending only on the number of new messages.
+	"""
+
+	# ───────────
+	# Constructor
+
+	def __init__(self, stream):
+		"""
+		StreamIndex constructor
+
+		:param stream: Map from timestamps to file names
+		:type stream: dict
+		"""
+		self._build(stream)
+
+	# ──────────
+	# Properties
+
+	@property
+	def stamps(self):
+		return self._stamps.values
+
+	@property
+	def keys(self):
+		if self._keys is None:
+			self._keys = [
+			    (int(stamp // NSEC_PER_SEC), int(stamp % NSEC_PER_SEC))\
+			        for stamp in self.stamps
+			]
+		return self._keys
+
+	@property
+	def first_stamp(self):
+		return self.stamps[0] if len(self) > 0 else None
+
+	@property
+	def last_stamp(self):
+		return self.stamps[-1] if len(self) > 0 else None
+
+	# ──────────
+	# Public API
+
+	def append(self, stream):
+		"""
+		Add new messages to the index.
+
+		Messages more recent than all the indexed ones are appended in place.
+		Otherwise, the whole index is rebuilt.
+
+		:param stream: Map from timestamps to file names of the new messages
+		:type stream: dict
+		:return: True if the messages were appended at the end of the index,
+		         False if the index was rebuilt
+		:rtype: bool
+		"""
+		new_keys = sorted(stream.keys())
+		if len(new_keys) == 0:
+			return True
+		new_stamps = toStamps(new_keys)
+		if len(self) > 0 and new_stamps[0] <= self.last_stamp:
+			merged_stream = dict(zip(self.keys, self.files))
+			merged_stream.update(stream)
+			self._build(merged_stream)
+			return False
+
+		self.files.extend([stream[key] for key in new_keys])
+		self._stamps.append(new_stamps)
+		self._keys = None
+		if self._pyramid is not None:
+			self._appendToPyramid(new_stamps)
+		self._statistics = dict()
+		return True
+
+	def indexAt(self, timestamp):
+		"""
+		Return the index of the latest stamp at or before a timestamp
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:return: Index of the matching stamp, -1 if there is none
+		:rtype: int
+		"""
+		return int(numpy.searchsorted(self.stamps, timestamp, side="right")) - 1
+
+	def stampAt(self, timestamp):
+		"""
+		Return the latest stamp at or before a timestamp
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:return: The matching stamp, None if there is none
+		:rtype: int
+		"""
+		index = self.indexAt(timestamp)
+		return self.stamps[index] if index >= 0 else None
+
+	def stampBefore(self, timestamp):
+		"""
+		Return the latest stamp strictly before a timestamp
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:return: The matching stamp, None if there is none
+		:rtype: int
+		"""
+		index = int(numpy.searchsorted(self.stamps, timestamp, side="left")) - 1
+		return self.stamps[index] if index >= 0 else None
+
+	def stampAfter(self, timestamp):
+		"""
+		Return the earliest stamp strictly after a timestamp
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:return: The matching stamp, None if there is none
+		:rtype: int
+		"""
+		index = int(numpy.searchsorted(self.stamps, timestamp, side="right"))
+		return self.stamps[index] if index < len(self) else None
+
+	def nearestIndexes(self, timestamps):
+		"""
+		Return, for each of several timestamps, the index of the closest stamp
+
+		:param timestamps: Times of the queries
+		:type timestamps: numpy.ndarray
+		:return: Index of the closest stamp for each query, -1 if the stream
+		         is empty
+		:rtype: numpy.ndarray
+		"""
+		timestamps = numpy.asarray(timestamps, dtype=numpy.int64)
+		if len(self) < 2:
+			return numpy.full(len(timestamps), len(self)-1, dtype=numpy.int64)
+		after = numpy.searchsorted(self.stamps, timestamps, side="left")
+		after = numpy.clip(after, 1, len(self)-1)
+		before = after - 1
+		before_is_closer = timestamps - self.stamps[before]\
+		                   <= self.stamps[after] - timestamps
+		return numpy.where(before_is_closer, before, after).astype(numpy.int64)
+
+	def density(self, start_stamp, end_stamp, bin_count):
+		"""
+		Count the stamps falling in each of `bin_count` equal bins splitting
+		the [start_stamp, end_stamp) window.
+
+		A pyramid level whose buckets are a few times smaller than a bin is
+		used, so that the cost depends on `bin_count` and not on the
+		number of stamps. When zoomed in beyond the finest level, or when
+		there are only a few stamps in the window, they are counted directly.
+
+		:param start_stamp: Beginning of the window
+		:type start_stamp: int
+		:param end_stamp: End of the window (excluded)
+		:type end_stamp: int
+		:param bin_count: Number of bins in the window
+		:type bin_count: int
+		:return: Number of stamps in each bin
+		:rtype: numpy.ndarray
+		"""
+		bin_count = int(bin_count)
+		if bin_count <= 0 or end_stamp <= start_stamp or len(self) == 0:
+			return numpy.zeros(max(bin_count, 0), dtype=numpy.int64)
+		bin_width = float(end_stamp - start_stamp) / bin_count
+
+		start_index = int(numpy.searchsorted(self.stamps, start_stamp, side="left"))
+		end_index = int(numpy.searchsorted(self.stamps, end_stamp, side="left"))
+
+		# Use buckets at least 4 times smaller than a bin, so that a bucket
+		# overlapping two bins does not noticeably skew the counts
+		pyramid = self._getPyramid()
+		level = int(math.floor(math.log(bin_width / pyramid["resolution"], 2))) - 2
+		if level < 0 or end_index - start_index <= 2*bin_count:
+			# Count the visible stamps directly
+			bins = (self.stamps[start_index:end_index] - start_stamp) / bin_width
+			bins = numpy.minimum(bins.astype(numpy.int64), bin_count-1)
+			return numpy.bincount(bins, minlength=bin_count)
+
+		level = min(level, len(pyramid["levels"])-1)
+		counts = pyramid["levels"][level]
+		bucket_width = pyramid["resolution"] * 2**level
+		first_bucket = int((start_stamp - pyramid["origin"]) // bucket_width)
+		last_bucket = -int((pyramid["origin"] - end_stamp) // bucket_width)
+		first_bucket = max(first_bucket, 0)
+		last_bucket = min(last_bucket, len(counts))
+		if last_bucket <= first_bucket:
+			return numpy.zeros(bin_count, dtype=numpy.int64)
+
+		bucket_stamps = pyramid["origin"]\
+		                + numpy.arange(first_bucket, last_bucket) * bucket_width
+		bins = numpy.floor((bucket_stamps - start_stamp) / bin_width)
+		bins = numpy.clip(bins, 0, bin_count-1).astype(numpy.int64)
+		return numpy.bincount(
+		           bins,
+		           weights=counts[first_bucket:last_bucket],
+		           minlength=bin_count
+		       ).astype(numpy.int64)
+
+	def statistics(self, percentiles=JITTER_PERCENTILES):
+		"""
+		Compute the rate and the regularity of the stream.
+
+		The jitter is the absolute difference between each interval separating
+		two consecutive messages and the median interval. Results are cached
+		until new messages are added.
+
+		:param percentiles: Percentiles of the jitter to compute
+		:type percentiles: tuple
+		:return: Dictionary containing the number of messages ("count"), the
+		         time between the first and last ones ("duration", in ns),
+		         the mean and median rates ("mean_rate" and "median_rate", in
+		         Hz), the median interval ("median_interval", in ns) and the
+		         jitter percentiles ("jitter", in ns, by percentile). Rates
+		         and intervals are None if there are less than two messages.
+		:rtype: dict
+		"""
+		percentiles = tuple(percentiles)
+		if percentiles in self._statistics:
+			return self._statistics[percentiles]
+
+		out = dict(count=len(self),
+		           duration=0,
+		           mean_rate=None,
+		           median_rate=None,
+		           median_interval=None,
+		           jitter=dict())
+		if len(self) >= 2:
+			intervals = numpy.diff(self.stamps)
+			median_interval = float(numpy.median(intervals))
+			duration = int(self.last_stamp - self.first_stamp)
+			out["duration"] = duration
+			out["median_interval"] = median_interval
+			if duration > 0:
+				out["mean_rate"] = float(len(intervals)) * NSEC_PER_SEC / duration
+			if median_interval > 0:
+				out["median_rate"] = NSEC_PER_SEC / median_interval
+			if len(percentiles) > 0:
+				jitter = numpy.percentile(numpy.abs(intervals - median_interval),
+				                          percentiles)
+				out["jitter"] = dict(zip(percentiles, jitter.tolist()))
+
+		self._statistics[percentiles] = out
+		return out
+
+	def gaps(self, min_duration, start_stamp=None, end_stamp=None):
+		"""
+		Find the intervals between consecutive messages lasting longer than
+		a given duration
+
+		:param min_duration: Shortest interval considered as a gap (in ns)
+		:type min_duration: int
+		:param start_stamp: If given, ignore gaps ending at or before this stamp
+		:type start_stamp: int
+		:param end_stamp: If given, ignore gaps starting after this stamp
+		:type end_stamp: int
+		:return: Array of (last stamp before the gap, first stamp after the
+		         gap) rows
+		:rtype: numpy.ndarray
+		"""
+		first_index = 0
+		last_index = len(self)
+		if start_stamp is not None:
+			first_index = max(self.indexAt(start_stamp), 0)
+		if end_stamp is not None:
+			last_index = int(numpy.searchsorted(self.stamps, end_stamp, side="left")) + 1
+		stamps = self.stamps[first_index:last_index]
+		gap_indexes = numpy.flatnonzero(numpy.diff(stamps) > min_duration)
+		return numpy.column_stack((stamps[gap_indexes], stamps[gap_indexes+1]))
+
+	# ───────────
+	# Private API
+
+	def _build(self, stream):
+		"""
+		Index the content of a stream, replacing the current index
+
+		:param stream: Map from timestamps to file names
+		:type stream: dict
+		"""
+		keys = sorted(stream.keys())
+		self.files = [stream[key] for key in keys]
+		self._stamps = _ArrayBuffer(toStamps(keys))
+		self._keys = None # built on first access
+		self._pyramid = None
+		self._statistics = dict()
+
+	def _appendToPyramid(self, new_stamps):
+		"""
+		Count new stamps, more recent than the others, in the density pyramid
+
+		:param new_stamps: Sorted stamps to add
+		:type new_stamps: numpy.ndarray
+		"""
+		pyramid = self._pyramid
+		levels = pyramid["levels"]
+		buckets = (new_stamps - pyramid["origin"]) // pyramid["resolution"]
+
+		# When the stream gets too long, drop the finest level so that the
+		# number of buckets remains bounded
+		while buckets[-1] >= PYRAMID_MAX_BUCKETS and len(levels) > 1:
+			levels.pop(0)
+			pyramid["resolution"] *= 2
+			buckets //= 2
+
+		for (level_number, counts) in enumerate(levels):
+			level_buckets = buckets >> level_number
+			first_bucket = int(level_buckets[0])
+			last_bucket = int(level_buckets[-1])
+			if last_bucket >= len(counts):
+				counts = numpy.append(
+				             counts,
+				             numpy.zeros(last_bucket + 1 - len(counts), dtype=numpy.uint32)
+				         )
+			counts[first_bucket:last_bucket+1] += numpy.bincount(
+			    level_buckets - first_bucket
+			).astype(numpy.uint32)
+			levels[level_number] = counts
+
+		# The coarsest level must still be a single bucket
+		while len(levels[-1]) > 1:
+			previous = levels[-1]
+			if len(previous) % 2 == 1:
+				previous = numpy.append(previous, numpy.uint32(0))
+			levels.append(previous[0::2] + previous[1::2])
+
+	def _getPyramid(self):
+		"""
+		Return the density pyramid of the stream, building it if needed
+
+		:return: Dictionary containing the time of the first bucket
+		         ("origin"), the duration of a bucket in the finest level
+		         ("resolution") and the bucket counts of each level ("levels")
+		:rtype: dict
+		"""
+		if self._pyramid is not None:
+			return self._pyramid
+
+		origin = int(self.stamps[0])
+		span = int(self.stamps[-1]) - origin
+		# Finest power-of-two resolution (in ns) keeping the number of buckets
+		# bounded
+		resolution = 1
+		while span // resolution >= PYRAMID_MAX_BUCKETS:
+			resolution *= 2
+		buckets = (self.stamps - origin) // resolution
+		levels = [numpy.bincount(buckets).astype(numpy.uint32)]
+		while len(levels[-1]) > 1:
+			previous = levels[-1]
+			if len(previous) % 2 == 1:
+				previous = numpy.append(previous, numpy.uint32(0))
+			levels.append(previous[0::2] + previous[1::2])
+
+		self._pyramid = dict(origin=origin, resolution=resolution, levels=levels)
+		return self._pyramid
+
+	# ───────────────
+	# Special methods
+
+	def __len__(self):
+		return len(self.stamps)
+
+class TimelineIndex(object):
+	"""
+	Merged index of the timestamps of several streams.
+
+	All stamps are sorted once in a single array, along with the stream they
+	belong to and their position in that stream, so that navigating through
+	the messages of all streams is done by binary search.
+
+	Messages appended to a stream are merged in the part of the timeline
+	following their earliest stamp, which is short when the streams grow
+	in chronological order.
+	"""
+
+	# ───────────
+	# Constructor
+
+	def __init__(self, stream_indexes):
+		"""
+		TimelineIndex constructor
+
+		:param stream_indexes: Index of each stream, by stream name
+		:type stream_indexes: dict
+		"""
+		self.stream_indexes = stream_indexes
+		self.stream_names = sorted(stream_indexes.keys())
+
+		stamps = [numpy.zeros(0, dtype=numpy.int64)]
+		stream_ids = [numpy.zeros(0, dtype=numpy.int32)]
+		positions = [numpy.zeros(0, dtype=numpy.int64)]
+		for (stream_id, name) in enumerate(self.stream_names):
+			stream_stamps = stream_indexes[name].stamps
+			stamps.append(stream_stamps)
+			stream_ids.append(
+			    numpy.full(len(stream_stamps), stream_id, dtype=numpy.int32)
+			)
+			positions.append(numpy.arange(len(stream_stamps), dtype=numpy.int64))
+
+		# Stable sort, so that equal stamps remain ordered by stream
+		order = numpy.argsort(numpy.concatenate(stamps), kind="mergesort")
+		self._stamps = _ArrayBuffer(numpy.concatenate(stamps)[order])
+		self._stream_ids = _ArrayBuffer(numpy.concatenate(stream_ids)[order])
+		self._positions = _ArrayBuffer(numpy.concatenate(positions)[order])
+
+	# ──────────
+	# Properties
+
+	@property
+	def stamps(self):
+		return self._stamps.values
+
+	@property
+	def stream_ids(self):
+		return self._stream_ids.values
+
+	@property
+	def positions(self):
+		return self._positions.values
+
+	# ──────────
+	# Public API
+
+	def append(self, stream_name, first_position):
+		"""
+		Add to the timeline the messages appended to a stream index
+
+		:param stream_name: Name of the stream which received new messages
+		:type stream_name: str
+		:param first_position: Position of the first new message in the stream
+		:type first_position: int
+		"""
+		new_stamps = self.stream_indexes[stream_name].stamps[first_position:]
+		if len(new_stamps) == 0:
+			return
+		stream_id = self.stream_names.index(stream_name)
+
+		# Only the messages after the earliest new one need to be reordered
+		start = int(numpy.searchsorted(self.stamps, new_stamps[0], side="right"))
+		stamps = numpy.concatenate([self.stamps[start:], new_stamps])
+		stream_ids = numpy.concatenate([
+		                 self.stream_ids[start:],
+		                 numpy.full(len(new_stamps), stream_id, dtype=numpy.int32)
+		             ])
+		positions = numpy.concatenate([
+		                self.positions[start:],
+		                numpy.arange(first_position,
+		                             first_position + len(new_stamps),
+		                             dtype=numpy.int64)
+		            ])
+		order = numpy.argsort(stamps, kind="mergesort")
+		self._stamps.replaceTail(start, stamps[order])
+		self._stream_ids.replaceTail(start, stream_ids[order])
+		self._positions.replaceTail(start, positions[order])
+
+	def streamAt(self, index):
+		"""
+		Return the name of the stream of a message
+
+		:param index: Index of the message in the timeline
+		:type index: int
+		:rtype: str
+		"""
+		return self.stream_names[self.stream_ids[index]]
+
+	def fileAt(self, index):
+		"""
+		Return the file of a message
+
+		:param index: Index of the message in the timeline
+		:type index: int
+		:rtype: str
+		"""
+		stream_index = self.stream_indexes[self.streamAt(index)]
+		return stream_index.files[self.positions[index]]
+
+	def indexAt(self, timestamp):
+		"""
+		Return the index of the latest message at or before a timestamp
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:return: Index of the matching message, -1 if there is none
+		:rtype: int
+		"""
+		return int(numpy.searchsorted(self.stamps, timestamp, side="right")) - 1
+
+	def nearestIndex(self, timestamp):
+		"""
+		Return the index of the message closest to a timestamp
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:return: Index of the matching message, -1 if the timeline is empty
+		:rtype: int
+		"""
+		if len(self) == 0:
+			return -1
+		after = int(numpy.searchsorted(self.stamps, timestamp, side="left"))
+		if after == len(self):
+			return after - 1
+		if after == 0:
+			return 0
+		if timestamp - self.stamps[after-1] <= self.stamps[after] - timestamp:
+			return after - 1
+		return after
+
+	def stampAt(self, timestamp):
+		"""
+		Return the latest stamp at or before a timestamp
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:return: The matching stamp, None if there is none
+		:rtype: int
+		"""
+		index = self.indexAt(timestamp)
+		return self.stamps[index] if index >= 0 else None
+
+	def previousStamp(self, timestamp):
+		"""
+		Return the latest stamp strictly before a timestamp
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:return: The matching stamp, None if there is none
+		:rtype: int
+		"""
+		index = int(numpy.searchsorted(self.stamps, timestamp, side="left")) - 1
+		return self.stamps[index] if index >= 0 else None
+
+	def nextStamp(self, timestamp):
+		"""
+		Return the earliest stamp strictly after a timestamp
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:return: The matching stamp, None if there is none
+		:rtype: int
+		"""
+		index = int(numpy.searchsorted(self.stamps, timestamp, side="right"))
+		return self.stamps[index] if index < len(self) else None
+
+	def nearestStamp(self, timestamp):
+		"""
+		Return the stamp closest to a timestamp
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:return: The matching stamp, None if the timeline is empty
+		:rtype: int
+		"""
+		index = self.nearestIndex(timestamp)
+		return self.stamps[index] if index >= 0 else None
+
+	def nextStampOnStream(self, timestamp, stream_name):
+		"""
+		Return the earliest stamp of a given stream strictly after a timestamp
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:param stream_name: Name of the stream to look into
+		:type stream_name: str
+		:return: The matching stamp, None if there is none
+		:rtype: int
+		"""
+		return self.stream_indexes[stream_name].stampAfter(timestamp)
+
+	def previousStampOnStream(self, timestamp, stream_name):
+		"""
+		Return the latest stamp of a given stream strictly before a timestamp
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:param stream_name: Name of the stream to look into
+		:type stream_name: str
+		:return: The matching stamp, None if there is none
+		:rtype: int
+		"""
+		return self.stream_indexes[stream_name].stampBefore(timestamp)
+
+	def nextSynchronizedStamp(self, timestamp):
+		"""
+		Return the earliest stamp after a timestamp at which every stream has
+		received a new message
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:return: The matching stamp, None if a stream has no more messages
+		:rtype: int
+		"""
+		next_stamps = [self.stream_indexes[name].stampAfter(timestamp)\
+		                   for name in self.stream_names]
+		if len(next_stamps) == 0 or None in next_stamps:
+			return None
+		return max(next_stamps)
+
+	def synchronizedPositionsAt(self, timestamp, stream_names, tolerance):
+		"""
+		Find the messages of several streams closest to a timestamp, if they
+		were all received within a time window
+
+		:param timestamp: Time of the query
+		:type timestamp: int
+		:param stream_names: Streams to synchronize
+		:type stream_names: list
+		:param tolerance: Longest time allowed between the earliest and the
+		                  latest message (in ns)
+		:type tolerance: int
+		:return: Position of the selected message in each stream, None if
+		         they are not synchronized
+		:rtype: list
+		"""
+		positions = self.synchronizedPositions(stream_names,
+		                                       tolerance,
+		                                       [timestamp])
+		if len(positions) == 0:
+			return None
+		return positions[0].tolist()
+
+	def synchronizedPositions(self, stream_names, tolerance, timestamps=None):
+		"""
+		Enumerate the sets of synchronized messages of several streams.
+
+		For each reference timestamp, the closest message of every stream is
+		selected, and the set is kept if all those messages were received
+		within the tolerance window. By default, the stamps of the stream with
+		the fewest messages are used as references, so that the whole
+		recording is enumerated.
+
+		:param stream_names: Streams to synchronize
+		:type stream_names: list
+		:param tolerance: Longest time allowed between the earliest and the
+		                  latest message of a set (in ns)
+		:type tolerance: int
+		:param timestamps: Reference timestamps
+		:type timestamps: numpy.ndarray
+		:return: Array with one row per synchronized set, containing the
+		         position of the message of each stream. Each set appears
+		         once, even if it is selected by several timestamps.
+		:rtype: numpy.ndarray
+		"""
+		stream_indexes = [self.stream_indexes[name] for name in stream_names]
+		if len(stream_indexes) == 0\
+		   or min([len(index) for index in stream_indexes]) == 0:
+			return numpy.zeros((0, len(stream_indexes)), dtype=numpy.int64)
+		if timestamps is None:
+			timestamps = min(stream_indexes, key=len).stamps
+
+		positions = numpy.column_stack(
+		                [index.nearestIndexes(timestamps) for index in stream_indexes]
+		            )
+		stamps = numpy.column_stack(
+		             [index.stamps[positions[:, i]]\
+		                  for (i, index) in enumerate(stream_indexes)]
+		         )
+		synchronized = stamps.max(axis=1) - stamps.min(axis=1) <= tolerance
+		positions = positions[synchronized]
+		if len(positions) < 2:
+			return positions
+
+		# Timestamps shared by several streams, or close to each other, select
+		# the same set several times. Keep the first occurrence of each set.
+		order = numpy.lexsort(positions.T[::-1])
+		sorted_positions = positions[order]
+		distinct = numpy.ones(len(positions), dtype=bool)
+		distinct[1:] = (sorted_positions[1:] != sorted_positions[:-1]).any(axis=1)
+		return positions[numpy.sort(order[distinct])]
+
+	# ───────────────
+	# Special methods
+
+	def __len__(self):
+		return len(self.stamps)
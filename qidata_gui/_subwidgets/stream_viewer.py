@@ -32,15 +32,51 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 # Standard libraries
-import bisect
+import math
 import os
+import time
 
 # Third-party libraries
-import cv2
+import numpy
 from PySide import QtGui, QtCore
 
 # Local modules
 from qidata_gui import RESOURCES_DIR
+from .stream_index import (
+                           findNewMessages,
+                           NSEC_PER_SEC,
+                           StreamIndex,
+                           TimelineIndex,
+                          )
+from .thumbnail_cache import ThumbnailCache
+
+#: Playback modes proposed by the StreamViewer. Each mode is either a speed
+#: relative to real time ("speed") or a fixed number of frames per second
+#: ("fps")
+PLAYBACK_MODES = [
+    ("0.25x", ("speed", 0.25)),
+    ("0.5x", ("speed", 0.5)),
+    ("1x", ("speed", 1.0)),
+    ("2x", ("speed", 2.0)),
+    ("4x", ("speed", 4.0)),
+    ("8x", ("speed", 8.0)),
+    ("16x", ("speed", 16.0)),
+    ("1 fps", ("fps", 1)),
+    ("5 fps", ("fps", 5)),
+    ("10 fps", ("fps", 10)),
+    ("30 fps", ("fps", 30)),
+]
+DEFAULT_PLAYBACK_MODE = "1x"
+
+#: Interval between two cursor updates when playing relatively to real time
+#: (in ms)
+PLAYBACK_TICK = 20
+
+#: Delay between two checks for new messages when following the streams (ms)
+LIVE_REFRESH_INTERVAL = 1000
+
+#: Delay between two checks for a thumbnail being generated (ms)
+THUMBNAIL_POLL_INTERVAL = 30
 
 class TimelineItem(QtGui.QGraphicsItem):
 
@@ -53,27 +89,47 @@ class TimelineItem(QtGui.QGraphicsItem):
 
 		:param parent: Parent of this item
 		:type parent: qidata_gui._subwidgets.StreamViewer
+		:param streams: Index of each displayed stream
+		:type streams: dict
 		"""
 		super(TimelineItem, self).__init__()
 		self._parent = parent
 
-		# Timeline boundries
+		# Needed to know which part of the item must be repainted
+		self.setFlag(QtGui.QGraphicsItem.ItemUsesExtendedStyleOption)
+
+		# Hovering a stream shows a thumbnail of its closest file
+		self.setAcceptHoverEvents(True)
+
+		# Timeline boundries (in ns)
 		self._start_stamp = None  # earliest of all stamps
 		self._end_stamp = None  # latest of all stamps
+		self._last_stamp = None  # stamp of the latest message
 		self._stamp_left = None  # earliest timestamp currently visible
 		self._stamp_right = None  # latest timestamp currently visible
 		self._history_top = 30
 		self._history_left = 0
 		self._history_width = 0
 		self._history_bottom = 0
+		self._history_boundaries = {}  # (x, y, w, h) of each stream history
 		self._margin_left = 4
 		self._margin_right = 40
 		self._margin_bottom = 20
 
+		# Zoom and pan
+		self._min_visible_span = 1000000  # shortest visible duration (in ns)
+		self._zoom_step = 0.8  # span factor applied for each wheel step
+		self._pan_origin_x = None  # x of the last pan position during a drag
+
 		# Background Rendering
 		self._history_background_color = QtGui.QColor(204, 204, 204, 102)
 		self._history_background_color_alternate = QtGui.QColor(179, 179, 179, 25)
 		self._history_external_color = QtGui.QColor(0, 0, 0, 25)
+		self._history_background_brush = QtGui.QBrush(self._history_background_color)
+		self._history_background_brush_alternate = QtGui.QBrush(
+		                                               self._history_background_color_alternate
+		                                           )
+		self._history_external_brush = QtGui.QBrush(self._history_external_color)
 
 		# Timeline Division Rendering
 		# Possible time intervals used between divisions
@@ -112,6 +168,14 @@ class TimelineItem(QtGui.QGraphicsItem):
 		self._stream_font.setBold(False)
 		self._stream_vertical_padding = 4
 
+		# Layout cache
+		# The layout only depends on the view width, the stream font and the
+		# stream names, it is computed again only when one of them changes
+		self._layout_key = None
+		self._stream_font_key = None
+		self._stream_font_metrics = None
+		self._stream_name_widths = dict()  # memoized width of each stream name
+
 		# Time Rendering
 		self._time_tick_height = 5
 		self._time_font_size = 10.0
@@ -123,15 +187,50 @@ class TimelineItem(QtGui.QGraphicsItem):
 		self._default_brush = QtGui.QBrush(QtCore.Qt.black, QtCore.Qt.SolidPattern)
 		self._default_pen = QtGui.QPen(QtCore.Qt.black)
 		self._default_datatype_color = QtGui.QColor(0, 0, 102, 204)
+		self._default_datatype_brush = QtGui.QBrush(self._default_datatype_color)
+		self._default_datatype_pen = QtGui.QPen(self._default_datatype_color, 1)
 		self._default_msg_combine_px = 1.0
 		# minimum number of pixels allowed between two messages before they are
 		# combined
 		self._active_message_line_width = 3
+		self._active_message_pen = QtGui.QPen(self._default_datatype_pen)
+		self._active_message_pen.setWidth(self._active_message_line_width)
+
+		# Density Rendering
+		# When enabled, message regions are shaded according to the number of
+		# messages they contain instead of being uniformly filled
+		self.density_shading = False
+		self._density_levels = 8
+		self._density_brushes = []
+		self._density_pens = []
+		for level in range(1, self._density_levels+1):
+			color = QtGui.QColor(self._default_datatype_color)
+			color.setAlpha(
+			    int(self._default_datatype_color.alpha() * level / self._density_levels)
+			)
+			self._density_brushes.append(QtGui.QBrush(color))
+			self._density_pens.append(QtGui.QPen(color, 1))
+
+		# Gap Rendering
+		# When set, intervals between two messages of a stream longer than
+		# gap_threshold times the median interval of that stream are
+		# highlighted
+		self.gap_threshold = None
+		self._gap_brush = QtGui.QBrush(QtGui.QColor(255, 0, 0, 64))
+		self._gap_pen = QtGui.QPen(QtGui.QColor(255, 0, 0, 128), 0)
 
 		# Current position Rendering
 		self._current_pos = None  # timestamp of the current_pos
 		self._current_pos_pointer_size = (6, 6)
 		self._current_pos_color = QtGui.QColor(255, 0, 0, 191)
+		self._current_pos_pen = QtGui.QPen(self._current_pos_color)
+		self._current_pos_brush = QtGui.QBrush(self._current_pos_color)
+
+		# Static layer cache
+		# Everything but the current position is rendered once in a pixmap,
+		# which is only rendered again when the view or the data changes
+		self._static_layer = None
+		self._static_layer_key = None
 
 	# ──────────
 	# Properties
@@ -145,12 +244,83 @@ class TimelineItem(QtGui.QGraphicsItem):
 		if current_pos == self._current_pos:
 			return
 
+		# Only the areas of the previous and new positions need a repaint
+		previous_pos_rects = self._get_current_pos_rects()
 		self._current_pos = current_pos
 
-		if self._current_pos != self._end_stamp:
-			self.scene().stick_to_end = False
+		# Follow new messages only while the cursor is on the latest one
+		self.scene().stick_to_end = self._current_pos is not None\
+		                            and self._last_stamp is not None\
+		                            and self._current_pos >= self._last_stamp
+
+		for rect in previous_pos_rects + self._get_current_pos_rects():
+			self.update(rect)
+
+	# ──────────
+	# Public API
+
+	def set_visible_range(self, stamp_left, stamp_right):
+		"""
+		Change the displayed part of the timeline. The requested range is
+		clamped to the timeline boundaries.
+
+		:param stamp_left: earliest timestamp to display
+		:type stamp_left: int
+		:param stamp_right: latest timestamp to display
+		:type stamp_right: int
+		"""
+		stamp_left = int(stamp_left)
+		span = max(int(stamp_right) - stamp_left, self._min_visible_span)
+		span = min(span, self._end_stamp - self._start_stamp)
+		stamp_left = min(max(stamp_left, self._start_stamp), self._end_stamp - span)
+
+		self._stamp_left = stamp_left
+		self._stamp_right = stamp_left + span
+		if self.scene() is not None:
+			self.scene().update()
+
+	def zoom(self, factor, center_stamp=None):
+		"""
+		Zoom around a timestamp, which stays at the same place on the view
+
+		:param factor: factor applied to the visible duration (values lower
+		               than 1 zoom in)
+		:type factor: float
+		:param center_stamp: timestamp around which to zoom (defaults to the
+		                     middle of the visible range)
+		:type center_stamp: int
+		"""
+		if center_stamp is None:
+			center_stamp = (self._stamp_left + self._stamp_right) // 2
+		# Scale the offsets only, which are small enough to be exact floats
+		self.set_visible_range(
+		    center_stamp - int(round((center_stamp - self._stamp_left) * factor)),
+		    center_stamp + int(round((self._stamp_right - center_stamp) * factor))
+		)
+
+	def pan(self, dstamp):
+		"""
+		Shift the visible range, keeping its duration
+
+		:param dstamp: duration to shift (positive values move to the future)
+		:type dstamp: int
+		"""
+		self.set_visible_range(self._stamp_left + dstamp,
+		                       self._stamp_right + dstamp)
 
-		self.scene().update()
+	def reset_zoom(self):
+		"""
+		Display the whole timeline
+		"""
+		self.set_visible_range(self._start_stamp, self._end_stamp)
+
+	def invalidate_static_layer(self):
+		"""
+		Force the static part of the timeline to be rendered again. This must
+		be called when the content of the streams changes.
+		"""
+		self._static_layer = None
+		self.update()
 
 	# ──────────────────────
 	# Override pure virtuals
@@ -167,27 +337,120 @@ class TimelineItem(QtGui.QGraphicsItem):
 			return
 
 		self._layout()
+		painter.drawPixmap(option.exposedRect,
+		                   self._get_static_layer(),
+		                   option.exposedRect)
+		self._draw_active_messages(painter)
+		self._draw_current_pos(painter)
+
+	# ───────────
+	# Private API
+
+	def _get_static_layer(self):
+		"""
+		Return a pixmap containing every part of the timeline that does not
+		depend on the current position, rendering it if the view changed
+		since the last call.
+
+		:returns: the rendered static layer
+		:rtype: QtGui.QPixmap
+		"""
+		key = (self._history_left, self._history_width, self._history_bottom,
+		       self._stamp_left, self._stamp_right,
+		       self._start_stamp, self._end_stamp,
+		       self.density_shading, self.gap_threshold)
+		if self._static_layer is not None and key == self._static_layer_key:
+			return self._static_layer
+
+		rect = self.boundingRect()
+		self._static_layer = QtGui.QPixmap(int(math.ceil(rect.width())),
+		                                   int(math.ceil(rect.height())))
+		self._static_layer.fill(QtCore.Qt.transparent)
+		self._static_layer_key = key
+
+		painter = QtGui.QPainter(self._static_layer)
 		self._draw_stream_dividers(painter)
 		self._draw_time_divisions(painter)
 		self._draw_stream_histories(painter)
+		self._draw_stream_gaps(painter)
 		self._draw_stream_ends(painter)
 		self._draw_stream_names(painter)
 		self._draw_history_border(painter)
-		self._draw_current_pos(painter)
+		painter.end()
+		return self._static_layer
 
-	# ───────────
-	# Private API
+	def _get_active_message_xs(self):
+		"""
+		Locate, for each stream, the latest message at or before the current
+		position, if it is visible.
+
+		:returns: list of (x, y, height) tuples, one per visible message
+		:rtype: list
+		"""
+		if self.current_pos is None:
+			return []
+		out = []
+		for stream_name in sorted(self._history_boundaries.keys()):
+			_, y, _, h = self._history_boundaries[stream_name]
+			current_pos_stamp = self.streams[stream_name].stampAt(self.current_pos)
+			if current_pos_stamp is None:
+				continue
+			if current_pos_stamp > self._stamp_left and current_pos_stamp < self._stamp_right:
+				out.append((self.map_stamp_to_x(current_pos_stamp), y, h))
+		return out
+
+	def _get_current_pos_rects(self):
+		"""
+		Compute the areas covered by the current position marker and by the
+		active message of each stream.
+
+		:returns: list of areas, in item coordinates
+		:rtype: list
+		"""
+		if self.current_pos is None\
+		   or self._stamp_left is None\
+		   or self._history_width <= 0:
+			return [self.boundingRect()]
+
+		pw, ph = self._current_pos_pointer_size
+		px = self.map_stamp_to_x(self.current_pos)
+		rects = [
+		    QtCore.QRectF(px - pw - 1,
+		                  self._history_top - ph - 1,
+		                  2*pw + 2,
+		                  self._history_bottom - self._history_top + 2*ph + 4)
+		]
+		lw = self._active_message_line_width
+		for (x, y, h) in self._get_active_message_xs():
+			rects.append(QtCore.QRectF(x - lw, y - lw, 2*lw, h + 2*lw))
+		return rects
 
 	def _qfont_width(self, name):
-		return QtGui.QFontMetrics(self._stream_font).width(name)
+		width = self._stream_name_widths.get(name)
+		if width is None:
+			width = self._stream_font_metrics.width(name)
+			self._stream_name_widths[name] = width
+		return width
 
 	def _layout(self):
 		"""
 		Recalculates the layout of the timeline to take into account any changes
 		that have occured
 		"""
+		scene_width = self.scene().views()[0].size().width()
+		font_key = self._stream_font.key()
+		if font_key != self._stream_font_key:
+			# Previous measures are obsolete
+			self._stream_font_key = font_key
+			self._stream_font_metrics = QtGui.QFontMetrics(self._stream_font)
+			self._stream_name_widths = dict()
+		layout_key = (scene_width, font_key, sorted(self.streams.keys()))
+		if layout_key == self._layout_key:
+			return
+		self._layout_key = layout_key
+
 		# Calculate history left and history width
-		self._scene_width = self.scene().views()[0].size().width()
+		self._scene_width = scene_width
 
 		max_stream_name_width = -1
 		for stream_name in self.streams:
@@ -195,12 +458,8 @@ class TimelineItem(QtGui.QGraphicsItem):
 			if max_stream_name_width <= stream_width:
 				max_stream_name_width = stream_width
 
-		# Calculate font height for each stream
-		self._stream_font_height = -1
-		for stream_name in self.streams:
-			stream_height = QtGui.QFontMetrics(self._stream_font).height()
-			if self._stream_font_height <= stream_height:
-				self._stream_font_height = stream_height
+		# All streams use the same font
+		self._stream_font_height = self._stream_font_metrics.height()
 
 		# Update the timeline boundries
 		new_history_left = self._margin_left + max_stream_name_width + self._stream_name_spacing
@@ -245,64 +504,86 @@ class TimelineItem(QtGui.QGraphicsItem):
 
 		# x, y, w, h = self._history_boundaries[stream]
 		_, y, _, h = self._history_boundaries[stream_name]
+		stream_index = self.streams[stream_name]
 
 		msg_y = y
 		msg_height = h
 
-		# Get the renderer and the message combine interval
-		msg_combine_interval = self.map_dx_to_dstamp(self._default_msg_combine_px)
-
-		# Get the stamps
-		all_stamps = self.streams[stream_name].keys()
-		all_stamps.sort()
-		all_stamps_in_float = map(lambda x: float(x[0])+float(x[1])/1000000000, all_stamps)
+		# Count messages in each group of pixels in which they are combined
+		px_per_bin = self._default_msg_combine_px
+		bin_count = int(numpy.ceil(self._history_width / px_per_bin))
+		density = stream_index.density(self._stamp_left,
+		                               self._stamp_right,
+		                               bin_count)
+
+		# Gather regions of connected messages by shading level, so that
+		# each level is drawn in a single call
+		rects_by_level = dict()
+		for (bin_start, bin_end, level) in self._get_density_regions(density):
+			rects_by_level.setdefault(level, []).append(
+			    QtCore.QRectF(self._history_left + bin_start * px_per_bin,
+			                  msg_y,
+			                  (bin_end - bin_start) * px_per_bin,
+			                  msg_height)
+			)
 
-		# start_index = bisect.bisect_left(all_stamps, self._stamp_left)
-		end_index = bisect.bisect_left(
-		                all_stamps_in_float,
-		                self._stamp_right
-		            )
+		for (level, rects) in rects_by_level.items():
+			if self.density_shading:
+				painter.setBrush(self._density_brushes[level-1])
+				painter.setPen(self._density_pens[level-1])
+			else:
+				painter.setBrush(self._default_datatype_brush)
+				painter.setPen(self._default_datatype_pen)
+			painter.drawRects(rects)
 
-		# Iterate through regions of connected messages
-		width_interval = self._history_width / (self._stamp_right - self._stamp_left)
+		painter.setBrush(self._default_brush)
+		painter.setPen(self._default_pen)
 
-		# Draw stamps
-		grouped_stamps = self._group_close_stamps(
-		                     all_stamps_in_float[:end_index],
-		                     msg_combine_interval
-		                 )
+	def _draw_stream_gaps(self, painter):
+		"""
+		Draw bands over the visible gaps of each stream
 
-		for (stamp_start, stamp_end) in grouped_stamps:
-			if stamp_end < self._stamp_left:
+		:param painter: allows access to paint functions
+		:type painter: QtGui.QPainter
+		"""
+		if self.gap_threshold is None:
+			return
+		rects = []
+		for stream_name in sorted(self._history_boundaries.keys()):
+			_, y, _, h = self._history_boundaries[stream_name]
+			stream_index = self.streams[stream_name]
+			median_interval = stream_index.statistics()["median_interval"]
+			if median_interval is None:
 				continue
+			gaps = stream_index.gaps(median_interval * self.gap_threshold,
+			                         self._stamp_left,
+			                         self._stamp_right)
+			for (gap_start, gap_end) in gaps.tolist():
+				x_start = self.map_stamp_to_x(gap_start)
+				x_end = self.map_stamp_to_x(gap_end)
+				rects.append(QtCore.QRectF(x_start, y, x_end - x_start, h))
+
+		if len(rects) == 0:
+			return
+		painter.setBrush(self._gap_brush)
+		painter.setPen(self._gap_pen)
+		painter.drawRects(rects)
+		painter.setBrush(self._default_brush)
+		painter.setPen(self._default_pen)
+
+	def _draw_active_messages(self, painter):
+		"""
+		Highlight, on each stream, the message active at the current position
 
-			region_x_start = self._history_left + (stamp_start - self._stamp_left) * width_interval
-			if region_x_start < self._history_left:
-				region_x_start = self._history_left  # Clip the region
-			region_x_end = self._history_left + (stamp_end - self._stamp_left) * width_interval
-			region_width = max(1, region_x_end - region_x_start)
-
-			painter.setBrush(QtGui.QBrush(self._default_datatype_color))
-			painter.setPen(QtGui.QPen(self._default_datatype_color, 1))
-			painter.drawRect(region_x_start, msg_y, region_width, msg_height)
-
-		# Draw active message
-		if self.current_pos is not None:
-			curpen = painter.pen()
-			oldwidth = curpen.width()
-			curpen.setWidth(self._active_message_line_width)
-			painter.setPen(curpen)
-			current_pos_stamp = None
-			current_pos_index = bisect.bisect_right(all_stamps_in_float, self.current_pos) - 1
-			if current_pos_index >= 0:
-				current_pos_stamp = all_stamps_in_float[current_pos_index]
-				if current_pos_stamp > self._stamp_left and current_pos_stamp < self._stamp_right:
-					current_pos_x = self._history_left\
-					                + (all_stamps_in_float[current_pos_index] - self._stamp_left)\
-					                  * width_interval
-					painter.drawLine(current_pos_x, msg_y, current_pos_x, msg_y + msg_height)
-			curpen.setWidth(oldwidth)
-			painter.setPen(curpen)
+		:param painter: allows access to paint functions
+		:type painter: QtGui.QPainter
+		"""
+		lines = [QtCore.QLineF(x, y, x, y + h)\
+		             for (x, y, h) in self._get_active_message_xs()]
+		if len(lines) == 0:
+			return
+		painter.setPen(self._active_message_pen)
+		painter.drawLines(lines)
 
 		painter.setBrush(self._default_brush)
 		painter.setPen(self._default_pen)
@@ -317,7 +598,7 @@ class TimelineItem(QtGui.QGraphicsItem):
 		"""
 		x_start = self.map_stamp_to_x(self._start_stamp)
 		x_end = self.map_stamp_to_x(self._end_stamp)
-		painter.setBrush(QtGui.QBrush(self._history_external_color))
+		painter.setBrush(self._history_external_brush)
 		painter.drawRect(self._history_left,
 		                 self._history_top,
 		                 x_start - self._history_left,
@@ -347,10 +628,10 @@ class TimelineItem(QtGui.QGraphicsItem):
 
 			if row % 2 == 0:
 				painter.setPen(QtCore.Qt.lightGray)
-				painter.setBrush(QtGui.QBrush(self._history_background_color_alternate))
+				painter.setBrush(self._history_background_brush_alternate)
 			else:
 				painter.setPen(QtCore.Qt.lightGray)
-				painter.setBrush(QtGui.QBrush(self._history_background_color))
+				painter.setBrush(self._history_background_brush)
 			left = max(clip_left, x)
 			painter.drawRect(left, y, min(clip_right - left, w), h)
 			row += 1
@@ -366,12 +647,16 @@ class TimelineItem(QtGui.QGraphicsItem):
 		"""
 		if self.current_pos is None:
 			return
+		if self.current_pos < self._stamp_left\
+		   or self.current_pos > self._stamp_right:
+			# Current position is out of the visible range
+			return
 		px = self.map_stamp_to_x(self.current_pos)
 		pw, ph = self._current_pos_pointer_size
 
 		# Line
-		painter.setPen(QtGui.QPen(self._current_pos_color))
-		painter.setBrush(QtGui.QBrush(self._current_pos_color))
+		painter.setPen(self._current_pos_pen)
+		painter.setBrush(self._current_pos_brush)
 		painter.drawLine(px, self._history_top - 1, px, self._history_bottom + 2)
 
 		# Upper triangle
@@ -440,7 +725,7 @@ class TimelineItem(QtGui.QGraphicsItem):
 		:param painter: allows access to paint functions
 		:type painter: QtGui.QPainter
 		"""
-		x_per_sec = self.map_dstamp_to_dx(1.0)
+		x_per_sec = self.map_dstamp_to_dx(NSEC_PER_SEC)
 		major_divisions = [s for s in self._sec_divisions\
 		                         if x_per_sec * s >= self._major_spacing]
 		if len(major_divisions) == 0:
@@ -458,11 +743,13 @@ class TimelineItem(QtGui.QGraphicsItem):
 
 		start_stamp = self._start_stamp
 
-		major_stamps = list(self._get_stamps(start_stamp, major_division))
+		major_stamps = list(self._get_stamps(start_stamp,
+		                                     self._to_nsec(major_division)))
 		self._draw_major_divisions(painter, major_stamps, start_stamp, major_division)
 
 		if minor_division:
-			minor_stamps = [s for s in self._get_stamps(start_stamp, minor_division)\
+			minor_stamps = [s for s in self._get_stamps(start_stamp,
+			                                            self._to_nsec(minor_division))\
 			                      if s not in major_stamps]
 			self._draw_minor_divisions(painter,
 			                           minor_stamps,
@@ -478,15 +765,21 @@ class TimelineItem(QtGui.QGraphicsItem):
 		:param stamps: Timestamps to display on the view
 		:type stamps: list
 		:param start_stamp: Timestamp used as time origin (becomes the 0.0000)
-		:type start_stamp: float
+		:type start_stamp: int
 		:param division: Number of seconds in a division
 		:type division: int
 		"""
+		if len(stamps) == 0:
+			return
 		label_y = self._history_top - self._current_pos_pointer_size[1] - 5
-		for stamp in stamps:
-			x = self.map_stamp_to_x(stamp, False)
+		xs = [self.map_stamp_to_x(stamp, False) for stamp in stamps]
 
-			label = self._get_label(division, stamp - start_stamp)
+		painter.setBrush(self._default_brush)
+		painter.setPen(self._default_pen)
+		painter.setFont(self._time_font)
+		for (stamp, x) in zip(stamps, xs):
+			label = self._get_label(division,
+			                        float(stamp - start_stamp) / NSEC_PER_SEC)
 			label_x = x + self._major_divisions_label_indent
 			# This check seems to always hide the date... If a problem occurs
 			# this might be reworked to provide a solution, but for now it is
@@ -494,14 +787,13 @@ class TimelineItem(QtGui.QGraphicsItem):
 			# solution
 			# if label_x + self._qfont_width(label) < self.scene().width():
 			# if label_x + self._qfont_width(label) < self._history_width:
-			painter.setBrush(self._default_brush)
-			painter.setPen(self._default_pen)
-			painter.setFont(self._time_font)
 			painter.drawText(label_x, label_y, label)
 
-			painter.setPen(self._major_division_pen)
-			painter.drawLine(x, label_y - self._time_tick_height - self._time_font_size,
-			                 x, self._history_bottom)
+		painter.setPen(self._major_division_pen)
+		line_top = label_y - self._time_tick_height - self._time_font_size
+		painter.drawLines(
+		    [QtCore.QLineF(x, line_top, x, self._history_bottom) for x in xs]
+		)
 
 		painter.setBrush(self._default_brush)
 		painter.setPen(self._default_pen)
@@ -515,49 +807,60 @@ class TimelineItem(QtGui.QGraphicsItem):
 		:param stamps: Timestamps to display on the view
 		:type stamps: list
 		:param start_stamp: Timestamp used as time origin (becomes the 0.0000)
-		:type start_stamp: float
+		:type start_stamp: int
 		:param division: Number of seconds in a division
 		:type division: int
 		"""
+		if len(stamps) == 0:
+			return
 		xs = [self.map_stamp_to_x(stamp) for stamp in stamps]
 		painter.setPen(self._minor_division_pen)
-		for x in xs:
-			painter.drawLine(x, self._history_top, x, self._history_bottom)
+		painter.drawLines(
+		    [QtCore.QLineF(x, self._history_top, x, self._history_bottom)\
+		         for x in xs]
+		)
 
 		painter.setPen(self._minor_division_tick_pen)
-		for x in xs:
-			painter.drawLine(
-			    x, self._history_top - self._time_tick_height,
-			    x, self._history_top
-			)
+		painter.drawLines(
+		    [QtCore.QLineF(x, self._history_top - self._time_tick_height,
+		                   x, self._history_top)\
+		         for x in xs]
+		)
 
 		painter.setBrush(self._default_brush)
 		painter.setPen(self._default_pen)
 
-	def _group_close_stamps(self, stamps, max_interval):
+	def _get_density_regions(self, density):
 		"""
-		Group timestamps closer from each other than `max_interval` into one
-		region
-
-		:param stamps: list of stamps to analyze
-		:type stamps: list
-		:param max_interval: seconds between each division
-		:type max_interval: int
-		"""
-		region_start, prev_stamp = None, None
-		for stamp in stamps:
-			if prev_stamp:
-				if stamp - prev_stamp > max_interval:
-					region_end = prev_stamp
-					yield (region_start, region_end)
-					region_start = stamp
-			else:
-				region_start = stamp
-
-			prev_stamp = stamp
-
-		if region_start and prev_stamp:
-			yield (region_start, prev_stamp)
+		Group consecutive bins containing messages into regions. When density
+		shading is enabled, regions are also split where the shading level
+		changes.
+
+		:param density: number of messages in each bin
+		:type density: numpy.ndarray
+		:returns: list of (first_bin, end_bin, level) tuples, end_bin being
+		          excluded and level being between 1 and `_density_levels`
+		:rtype: list
+		"""
+		if self.density_shading and len(density) > 0 and density.max() > 0:
+			# Logarithmic scale, so that sparse regions remain visible
+			levels = numpy.ceil(
+			             self._density_levels\
+			             * numpy.log1p(density) / numpy.log1p(density.max())
+			         ).astype(numpy.int64)
+		else:
+			levels = (density > 0).astype(numpy.int64)
+
+		# A region boundary is wherever the level changes
+		padded_levels = numpy.concatenate(([0], levels, [0]))
+		boundaries = numpy.flatnonzero(numpy.diff(padded_levels))
+		region_starts = boundaries[:-1]
+		region_ends = boundaries[1:]
+		region_levels = levels[region_starts]
+		visible = region_levels > 0
+		return zip(region_starts[visible].tolist(),
+		           region_ends[visible].tolist(),
+		           region_levels[visible].tolist())
 
 	def _get_stamps(self, start_stamp, stamp_step):
 		"""
@@ -565,21 +868,31 @@ class TimelineItem(QtGui.QGraphicsItem):
 
 		:param start_stamp: beginning of timeline stamp
 		:type start_stamp: int
-		:param stamp_step: seconds between each division
+		:param stamp_step: nanoseconds between each division
 		:type stamp_step: int
 		"""
 		if start_stamp >= self._stamp_left:
 			stamp = start_stamp
 		else:
 			stamp = start_stamp\
-			        + int((self._stamp_left - start_stamp) / stamp_step)\
+			        + ((self._stamp_left - start_stamp) // stamp_step)\
 			          * stamp_step\
 			        + stamp_step
 
-		while stamp < self._end_stamp:
+		while stamp < min(self._end_stamp, self._stamp_right):
 			yield stamp
 			stamp += stamp_step
 
+	def _to_nsec(self, seconds):
+		"""
+		Converts a duration in seconds to nanoseconds
+
+		:param seconds: duration to convert
+		:type seconds: float
+		:rtype: int
+		"""
+		return int(round(seconds * NSEC_PER_SEC))
+
 	def _get_label(self, division, elapsed):
 		"""
 		Generates a label representing the elapsed time
@@ -587,7 +900,7 @@ class TimelineItem(QtGui.QGraphicsItem):
 		:param division: number of seconds in a division
 		:type division: int
 		:param elapsed: seconds from the beginning
-		:type elapsed: int
+		:type elapsed: float
 		:returns: relevant time elapsed string
 		:rtype: str
 		"""
@@ -636,7 +949,8 @@ class TimelineItem(QtGui.QGraphicsItem):
 			elif fraction >= 1.0:
 				return self._stamp_right
 
-		return self._stamp_left + fraction * (self._stamp_right - self._stamp_left)
+		return self._stamp_left\
+		       + int(round(fraction * (self._stamp_right - self._stamp_left)))
 
 	def map_dx_to_dstamp(self, dx):
 		"""
@@ -664,7 +978,7 @@ class TimelineItem(QtGui.QGraphicsItem):
 		"""
 		if self._stamp_left is None:
 			return None
-		fraction = (stamp - self._stamp_left) / (self._stamp_right - self._stamp_left)
+		fraction = float(stamp - self._stamp_left) / (self._stamp_right - self._stamp_left)
 
 		if clamp_to_visible:
 			fraction = min(1.0, max(0.0, fraction))
@@ -676,7 +990,7 @@ class TimelineItem(QtGui.QGraphicsItem):
 		Converts a distance in pixel space to a distance in stamp space
 
 		:param dstamp: distance in stamp space to be converted
-		:type dx: float
+		:type dstamp: int
 		:returns: distance in pixel space
 		:rtype: float
 		"""
@@ -689,39 +1003,101 @@ class TimelineItem(QtGui.QGraphicsItem):
 			if y >= self._history_top and y <= self._history_bottom:
 				# Clicked within timeline - set current_pos
 				current_pos = self.map_x_to_stamp(x)
-				if current_pos <= 0.0:
+				if current_pos <= 0:
 					self.current_pos = self._start_stamp
 				else:
 					self.current_pos = current_pos
-				self.scene().update()
+
+	def _get_stream_at(self, pos):
+		"""
+		Find the stream whose history contains a position
+
+		:param pos: position in item coordinates
+		:type pos: QtCore.QPointF
+		:returns: name of the stream, None if there is none
+		:rtype: str
+		"""
+		if pos.x() < self._history_left\
+		   or pos.x() > self._history_left + self._history_width:
+			return None
+		for (stream_name, (_, y, _, h)) in self._history_boundaries.items():
+			if y <= pos.y() < y + h:
+				return stream_name
+		return None
+
+	def _is_pan_event(self, event):
+		"""
+		Tell if a mouse press must start panning the timeline instead of
+		moving the current position (middle button, or shift + left button)
+		"""
+		return event.button() == QtCore.Qt.MiddleButton\
+		       or bool(event.modifiers() & QtCore.Qt.ShiftModifier)
 
 	# ─────
 	# Slots
 
 	def mousePressEvent(self, event):
 		event.accept()
+		if self._is_pan_event(event):
+			self._pan_origin_x = event.pos().x()
+			return
 		self._moveCurrentPosTo(event.pos())
 
 	def mouseMoveEvent(self, event):
 		event.accept()
+		if self._pan_origin_x is not None:
+			# Dragging to the right shows earlier timestamps
+			dx = event.pos().x() - self._pan_origin_x
+			self._pan_origin_x = event.pos().x()
+			self.pan(-int(round(self.map_dx_to_dstamp(dx))))
+			return
 		self._moveCurrentPosTo(event.pos())
 
 	def mouseReleaseEvent(self, event):
 		event.accept()
+		if self._pan_origin_x is not None:
+			self._pan_origin_x = None
+			return
 		self._moveCurrentPosTo(event.pos())
 
 		self._parent.objectSelected.emit(
 		    self._parent.getFileAtStamp(self.current_pos)
 		)
 
+	def hoverMoveEvent(self, event):
+		stream_name = self._get_stream_at(event.pos())
+		if stream_name is None:
+			self._parent.hideThumbnail()
+			return
+		stream_index = self.streams[stream_name]
+		index = stream_index.nearestIndexes([self.map_x_to_stamp(event.pos().x())])[0]
+		if index < 0:
+			self._parent.hideThumbnail()
+			return
+		self._parent.showThumbnail(stream_index.files[index], event.screenPos())
+
+	def hoverLeaveEvent(self, event):
+		self._parent.hideThumbnail()
+
+	def wheelEvent(self, event):
+		event.accept()
+		# delta encodes the angle rotated in a certain amount of units. 120
+		# units represents 15 degrees, which is a classical basic step on
+		# most mice. Each step zooms in (or out) by a constant factor.
+		steps = event.delta() / 120.0
+		self.zoom(self._zoom_step**steps,
+		          self.map_x_to_stamp(event.pos().x()))
+
 class StreamViewer(QtGui.QWidget):
 
 	objectSelected = QtCore.Signal(list)
+	playbackStateChanged = QtCore.Signal(bool)
+	liveRefreshRequested = QtCore.Signal()
 
 	# ───────────
 	# Constructor
 
-	def __init__(self, streams, parent=None):
+	def __init__(self, streams, parent=None, root_path=None, thumbnail_cache_dir=None):
 		"""
 		Constructs a widget displaying data streams.
 
@@ -729,6 +1105,12 @@ class StreamViewer(QtGui.QWidget):
 		:type streams: dict
 		:param parent: Parent of this widget
 		:type parent: QtGui.QWidget
+		:param root_path: Folder containing the stream files. Thumbnails are
+		                  shown when hovering the streams only if it is given.
+		:type root_path: str
+		:param thumbnail_cache_dir: Folder where thumbnails are saved to be
+		                            reused later (optional)
+		:type thumbnail_cache_dir: str
 		"""
 
 		# Initialize class
@@ -736,19 +1118,12 @@ class StreamViewer(QtGui.QWidget):
 		self.main_layout = QtGui.QVBoxLayout(self)
 		self.setLayout(self.main_layout)
 
-		# Retrieve first and last timestamps
-		_streams_ts_float = dict()
+		# Index every stream once, all lookups are then made on the indexes
+		self.stream_indexes = dict()
 		for stream_name in streams.keys():
-			tuple_ts = streams[stream_name].keys()
-			float_ts = map(lambda x: float(x[0]) + float(x[1])/1000000000, tuple_ts)
-			_streams_ts_float[stream_name] = float_ts
-			_streams_ts_float[stream_name].sort()
-
-		self.streams = streams
-		self.stamps_by_stream = _streams_ts_float
-
-		_start = min([x[0] for x in _streams_ts_float.values()])
-		_end = max([x[-1] for x in _streams_ts_float.values()])+1
+			self.stream_indexes[stream_name] = StreamIndex(streams[stream_name])
+		self.timeline_index = TimelineIndex(self.stream_indexes)
+		self._streams = None # built on first access
 
 		# Create view and set view alignment
 		self.view = QtGui.QGraphicsView()
@@ -758,17 +1133,14 @@ class StreamViewer(QtGui.QWidget):
 		# Create scene
 		self._scene = QtGui.QGraphicsScene()
 		self._scene.setBackgroundBrush(QtCore.Qt.white)
+		self._scene.stick_to_end = False
 		self.view.setScene(self._scene)
 
 		# Create timeline item
-		self._timeline = TimelineItem(self, streams)
+		self._timeline = TimelineItem(self, self.stream_indexes)
 		self._scene.addItem(self._timeline)
 		self._timeline.setPos(0, 0)
-
-			# For now, all the timeline is always visible, but this might
-			# change in the future, hence the "left" and "right" stamps
-		self._timeline._start_stamp = self._timeline._stamp_left = _start
-		self._timeline._end_stamp = self._timeline._stamp_right = _end
+		self._updateTimelineBoundaries()
 
 		# Create buttons to navigate between frames
 		self.buttons_widget = QtGui.QWidget(self)
@@ -789,6 +1161,18 @@ class StreamViewer(QtGui.QWidget):
 		    )
 		)
 
+		self._play_icon = self.style().standardIcon(QtGui.QStyle.SP_MediaPlay)
+		self._pause_icon = self.style().standardIcon(QtGui.QStyle.SP_MediaPause)
+		self.play_button = QtGui.QPushButton("", self.buttons_widget)
+		self.buttons_layout.addWidget(self.play_button)
+		self.play_button.setToolTip("Play")
+		self.play_button.setIcon(self._play_icon)
+		self.play_button.setFixedSize(
+		    prev_ic.actualSize(
+		        prev_ic.availableSizes()[0]
+		    )
+		)
+
 		self.next_button = QtGui.QPushButton("", self.buttons_widget)
 		self.buttons_layout.addWidget(self.next_button)
 		self.next_button.setToolTip("Open next frame")
@@ -802,97 +1186,682 @@ class StreamViewer(QtGui.QWidget):
 		    )
 		)
 
+		self.fit_button = QtGui.QPushButton("", self.buttons_widget)
+		self.buttons_layout.addWidget(self.fit_button)
+		self.fit_button.setToolTip("Show the whole timeline")
+		fit_ic_path = os.path.join(RESOURCES_DIR, "zoom_fit.png")
+		fit_ic = QtGui.QIcon(fit_ic_path)
+		self.fit_button.setIcon(fit_ic)
+		self.fit_button.setIconSize(fit_ic.availableSizes()[0])
+		self.fit_button.setFixedSize(
+		    fit_ic.actualSize(
+		        fit_ic.availableSizes()[0]
+		    )
+		)
+
+		self.live_button = QtGui.QPushButton("", self.buttons_widget)
+		self.buttons_layout.addWidget(self.live_button)
+		self.live_button.setToolTip("Follow new messages")
+		self.live_button.setCheckable(True)
+		live_ic_path = os.path.join(RESOURCES_DIR, "arrow_refresh.png")
+		live_ic = QtGui.QIcon(live_ic_path)
+		self.live_button.setIcon(live_ic)
+		self.live_button.setIconSize(live_ic.availableSizes()[0])
+		self.live_button.setFixedSize(
+		    live_ic.actualSize(
+		        live_ic.availableSizes()[0]
+		    )
+		)
+
+		self.speed_selector = QtGui.QComboBox(self.buttons_widget)
+		self.buttons_layout.addWidget(self.speed_selector)
+		self.speed_selector.setToolTip("Playback speed")
+		for (label, mode) in PLAYBACK_MODES:
+			self.speed_selector.addItem(label, mode)
+		self.speed_selector.setCurrentIndex(
+		    self.speed_selector.findText(DEFAULT_PLAYBACK_MODE)
+		)
+
 		self.previous_button.clicked.connect(self.moveToPreviousFrame)
 		self.next_button.clicked.connect(self.moveToNextFrame)
+		self.fit_button.clicked.connect(self._timeline.reset_zoom)
+		self.play_button.clicked.connect(self.togglePlayback)
+		self.live_button.toggled.connect(self._setLive)
+		self.speed_selector.currentIndexChanged.connect(
+		    self._restartPlaybackClock
+		)
+
+		# Playback
+		self._playback_timer = QtCore.QTimer(self)
+		self._playback_timer.timeout.connect(self._playbackTick)
+		self._playback_origin = None # (wall clock time, stamp) of the start
+		self._playback_last_stamp = None # latest stamp reached by playback
+
+		# Live tail
+		self._live_timer = QtCore.QTimer(self)
+		self._live_timer.setInterval(LIVE_REFRESH_INTERVAL)
+		self._live_timer.timeout.connect(self.liveRefreshRequested)
+
+		# Hover thumbnails
+		self._thumbnails = None
+		if root_path is not None:
+			self._thumbnails = ThumbnailCache(root_path,
+			                                  cache_dir=thumbnail_cache_dir)
+		self._thumbnail_label = QtGui.QLabel(self, QtCore.Qt.ToolTip)
+		self._thumbnail_timer = QtCore.QTimer(self)
+		self._thumbnail_timer.setInterval(THUMBNAIL_POLL_INTERVAL)
+		self._thumbnail_timer.timeout.connect(self._updateThumbnail)
+		self._hovered_file = None
+		self._hovered_pos = None
+
+		# Pinch gestures zoom on the timeline
+		self.view.viewport().grabGesture(QtCore.Qt.PinchGesture)
+		self.view.viewport().installEventFilter(self)
+
+	# ──────────
+	# Properties
+
+	@property
+	def streams(self):
+		if self._streams is None:
+			self._streams = dict(
+			    [(name, dict(zip(index.keys, index.files)))\
+			         for (name, index) in self.stream_indexes.items()]
+			)
+		return self._streams
+
+	@property
+	def stamps_by_stream(self):
+		return dict(
+		    [(name, index.stamps) for (name, index) in self.stream_indexes.items()]
+		)
+
+	@property
+	def current_file(self):
+		if self._timeline.current_pos is None:
+			return ""
+		return self.getFileAtStamp(self._timeline.current_pos)
+
+	@property
+	def playback_mode(self):
+		return self.speed_selector.itemData(self.speed_selector.currentIndex())
+
+	@property
+	def playing(self):
+		return self._playback_timer.isActive()
+
+	@property
+	def live(self):
+		return self.live_button.isChecked()
+
+	@live.setter
+	def live(self, new_value):
+		self.live_button.setChecked(new_value)
+
+	@property
+	def density_shading(self):
+		return self._timeline.density_shading
+
+	@density_shading.setter
+	def density_shading(self, new_value):
+		self._timeline.density_shading = new_value
+		self._scene.update()
+
+	@property
+	def gap_threshold(self):
+		return self._timeline.gap_threshold
+
+	@gap_threshold.setter
+	def gap_threshold(self, new_value):
+		self._timeline.gap_threshold = new_value
+		self._scene.update()
 
 	# ──────────
 	# Public API
 
+	def updateStream(self, stream_name, stream):
+		"""
+		Replace the content of a stream and rebuild its index. Other streams
+		are left untouched.
+
+		:param stream_name: Name of the stream to update
+		:type stream_name: str
+		:param stream: Map from timestamps to file names
+		:type stream: dict
+		"""
+		self.stream_indexes[stream_name] = StreamIndex(stream)
+		self.timeline_index = TimelineIndex(self.stream_indexes)
+		self._streamsChanged()
+
+	def appendToStream(self, stream_name, stream):
+		"""
+		Add new messages to a stream, creating it if needed. The cost only
+		depends on the number of new messages, as long as they are more
+		recent than the ones already in the stream.
+
+		:param stream_name: Name of the stream receiving the messages
+		:type stream_name: str
+		:param stream: Map from timestamps to file names of the new messages
+		:type stream: dict
+		"""
+		self._appendToIndexes(stream_name, stream)
+		self._streamsChanged()
+
+	def refreshStreams(self, streams):
+		"""
+		Update the displayed streams with the current content of growing
+		streams. Only the messages more recent than the displayed ones are
+		indexed, unchanged streams are skipped.
+
+		:param streams: Map containing the streams
+		:type streams: dict
+		"""
+		self.addMessages(*findNewMessages(streams, self.getStreamCursors()))
+
+	def addMessages(self, new_messages, rebuilt_streams=None):
+		"""
+		Add the messages found by
+		:func:`qidata_gui._subwidgets.stream_index.findNewMessages`. The cost
+		only depends on the number of new messages, unless some streams must
+		be indexed again.
+
+		:param new_messages: Map from stream names to their new messages
+		:type new_messages: dict
+		:param rebuilt_streams: Map from stream names to streams to index
+		                        again entirely
+		:type rebuilt_streams: dict
+		"""
+		rebuilt_streams = rebuilt_streams or dict()
+		for (stream_name, stream) in rebuilt_streams.items():
+			self.stream_indexes[stream_name] = StreamIndex(stream)
+		if len(rebuilt_streams) > 0:
+			self.timeline_index = TimelineIndex(self.stream_indexes)
+		for (stream_name, stream) in new_messages.items():
+			self._appendToIndexes(stream_name, stream)
+		if len(new_messages) > 0 or len(rebuilt_streams) > 0:
+			self._streamsChanged()
+
+	def getStreamCursors(self):
+		"""
+		Return, for each stream, the number of indexed messages and the stamp
+		of the most recent one (see
+		:func:`qidata_gui._subwidgets.stream_index.findNewMessages`)
+
+		:rtype: dict
+		"""
+		return dict(
+		    [(name, (len(index), index.last_stamp))\
+		         for (name, index) in self.stream_indexes.items()]
+		)
+
+	def showThumbnail(self, file_name, screen_pos):
+		"""
+		Show a thumbnail of a file next to a position. If the thumbnail is not
+		available yet, it is shown as soon as it is generated.
+
+		:param file_name: File to preview
+		:type file_name: str
+		:param screen_pos: Position of the pointer, in screen coordinates
+		:type screen_pos: QtCore.QPoint
+		"""
+		if self._thumbnails is None:
+			return
+		self._hovered_file = file_name
+		self._hovered_pos = screen_pos
+		self._updateThumbnail()
+
+	def hideThumbnail(self):
+		"""
+		Hide the thumbnail shown when hovering the streams
+		"""
+		self._hovered_file = None
+		self._thumbnail_timer.stop()
+		self._thumbnail_label.hide()
+
+	def getStreamStatistics(self, stream_name):
+		"""
+		Return the rate and jitter of a stream
+
+		:param stream_name: Name of the stream to analyze
+		:type stream_name: str
+		:return: statistics of the stream (see
+		         :meth:`qidata_gui._subwidgets.stream_index.StreamIndex.statistics`)
+		:rtype: dict
+		"""
+		return self.stream_indexes[stream_name].statistics()
+
+	def getStreamGaps(self, stream_name, min_duration=None):
+		"""
+		Return the gaps of a stream, where no message was received for a long
+		time
+
+		:param stream_name: Name of the stream to analyze
+		:type stream_name: str
+		:param min_duration: Shortest interval considered as a gap (in ns).
+		                     Defaults to the gap threshold of the timeline
+		                     times the median interval of the stream.
+		:type min_duration: int
+		:return: Array of (last stamp before the gap, first stamp after the
+		         gap) rows
+		:rtype: numpy.ndarray
+		"""
+		stream_index = self.stream_indexes[stream_name]
+		if min_duration is None:
+			median_interval = stream_index.statistics()["median_interval"]
+			if self.gap_threshold is None or median_interval is None:
+				return numpy.zeros((0, 2), dtype=numpy.int64)
+			min_duration = median_interval * self.gap_threshold
+		return stream_index.gaps(min_duration)
+
 	def getFileAtStamp(self, timestamp):
 		"""
 		Return the latest file activated at a specific timestamp
 
-		:param timestamp: Time where we want to know the active file
-		:type timestamp: float
+		:param timestamp: Time where we want to know the active file (in ns)
+		:type timestamp: int
 		:return: the latest activated file
 		:rtype: str
 		"""
-		out = ""
-		out_ts = (0,0)
-		for stream_name in self.stamps_by_stream.keys():
-			ts_index = bisect.bisect_right(self.stamps_by_stream[stream_name], timestamp)-1
-			if ts_index < 0:
-				continue
-			tuple_ts = self.streams[stream_name].keys()
-			tuple_ts.sort()
-			if tuple_ts[ts_index] > out_ts:
-				out_ts = tuple_ts[ts_index]
-				out = self.streams[stream_name][tuple_ts[ts_index]]
-		return out
+		index = self.timeline_index.indexAt(timestamp)
+		if index < 0:
+			return ""
+		return self.timeline_index.fileAt(index)
 
 	def getFilesAtStamp(self, timestamp):
 		"""
 		Return the list of files active at a specific timestamp
 
-		:param timestamp: Time where we want to know the active files
-		:type timestamp: float
+		:param timestamp: Time where we want to know the active files (in ns)
+		:type timestamp: int
 		:return: list of active files
 		:rtype: list
 		"""
 		out = []
-		for stream_name in self.stamps_by_stream.keys():
-			ts_index = bisect.bisect_right(self.stamps_by_stream[stream_name], timestamp)-1
+		for stream_index in self.stream_indexes.values():
+			ts_index = stream_index.indexAt(timestamp)
 			if ts_index < 0:
 				continue
-			tuple_ts = self.streams[stream_name].keys()
-			tuple_ts.sort()
-			out.append(self.streams[stream_name][tuple_ts[ts_index]])
+			out.append(stream_index.files[ts_index])
 		return out
 
+	def getSynchronizedFilesAtStamp(self, timestamp, tolerance, stream_names=None):
+		"""
+		Return the files of several streams closest to a timestamp, provided
+		they were all received within a time window
+
+		:param timestamp: Time where we want the synchronized files (in ns)
+		:type timestamp: int
+		:param tolerance: Longest time allowed between the earliest and the
+		                  latest file (in ns)
+		:type tolerance: int
+		:param stream_names: Streams to synchronize (defaults to all streams)
+		:type stream_names: list
+		:return: one file per stream, in the order of ``stream_names``, or an
+		         empty list if the files are not synchronized
+		:rtype: list
+		"""
+		if stream_names is None:
+			stream_names = self.timeline_index.stream_names
+		positions = self.timeline_index.synchronizedPositionsAt(timestamp,
+		                                                        stream_names,
+		                                                        tolerance)
+		if positions is None:
+			return []
+		return [self.stream_indexes[name].files[position]\
+		            for (name, position) in zip(stream_names, positions)]
+
+	def getSynchronizedFiles(self, tolerance, stream_names=None):
+		"""
+		Return all the sets of synchronized files of several streams. Each
+		file of the stream with the fewest messages is matched with the
+		closest file of every other stream, and the set is kept if they were
+		all received within the tolerance window.
+
+		:param tolerance: Longest time allowed between the earliest and the
+		                  latest file of a set (in ns)
+		:type tolerance: int
+		:param stream_names: Streams to synchronize (defaults to all streams)
+		:type stream_names: list
+		:return: sets of files, each one ordered as ``stream_names``
+		:rtype: list
+		"""
+		if stream_names is None:
+			stream_names = self.timeline_index.stream_names
+		positions = self.timeline_index.synchronizedPositions(stream_names,
+		                                                      tolerance)
+		files = [[self.stream_indexes[name].files[p] for p in positions[:, i]]\
+		             for (i, name) in enumerate(stream_names)]
+		return zip(*files)
+
+	def getUpcomingFiles(self, count):
+		"""
+		Return the files that will be selected next. When playing relatively
+		to real time, the files are the ones reached on the next playback
+		ticks, otherwise the files of the next frames.
+
+		:param count: Maximum number of files to return
+		:type count: int
+		:return: the upcoming files, in order
+		:rtype: list
+		"""
+		if self._timeline.current_pos is None:
+			return []
+		current_index = self.timeline_index.indexAt(self._timeline.current_pos)
+		mode, value = self.playback_mode
+		if self.playing and mode == "speed":
+			step = int(value * PLAYBACK_TICK * NSEC_PER_SEC / 1000)
+			stamps = self._timeline.current_pos\
+			         + step * numpy.arange(1, count+1, dtype=numpy.int64)
+			indexes = numpy.searchsorted(self.timeline_index.stamps,
+			                             stamps,
+			                             side="right") - 1
+			indexes = numpy.unique(indexes[indexes > current_index])
+		else:
+			indexes = range(current_index+1,
+			                min(current_index+1+count, len(self.timeline_index)))
+		return [self.timeline_index.fileAt(i) for i in indexes]
+
+	def play(self):
+		"""
+		Start moving the cursor automatically, at the selected playback speed.
+		Playback restarts from the beginning if the cursor is at the end of
+		the timeline.
+		"""
+		if self.playing or len(self.timeline_index) == 0:
+			return
+		if self._timeline.current_pos is None\
+		   or self.timeline_index.nextStamp(self._timeline.current_pos) is None:
+			self._moveTo(self.timeline_index.stamps[0])
+
+		self._restartPlaybackClock()
+		self._playback_timer.start()
+		self.play_button.setIcon(self._pause_icon)
+		self.play_button.setToolTip("Pause")
+		self.playbackStateChanged.emit(True)
+
+	def pause(self):
+		"""
+		Stop moving the cursor automatically
+		"""
+		if not self.playing:
+			return
+		self._playback_timer.stop()
+		self.play_button.setIcon(self._play_icon)
+		self.play_button.setToolTip("Play")
+		self.playbackStateChanged.emit(False)
+
+	def togglePlayback(self):
+		"""
+		Pause if playing, play otherwise
+		"""
+		if self.playing:
+			self.pause()
+		else:
+			self.play()
+
 	def moveToPreviousFrame(self):
 		"""
 		Slides the cursor to the previous frame. Does nothing if there is no
 		frame before the current position
 		"""
-		all_ts = [s for t in self.stamps_by_stream.values() for s in t]
-		all_ts.sort()
-		first_frame = all_ts[0]
+		if self._timeline.current_pos is None:
+			return
 
-		selected_index = bisect.bisect_right(all_ts, self._timeline.current_pos)-1
-		if selected_index <= 0 or all_ts[selected_index-1] < first_frame:
-			# There is no data before, or no frame. Do nothing
+		# Find the frame currently displayed
+		selected_stamp = self.timeline_index.stampAt(self._timeline.current_pos)
+		if selected_stamp is None:
+			# There is no data before. Do nothing
 			return
-		self._timeline.current_pos = all_ts[selected_index-1]
-		self.objectSelected.emit(
-		    self.getFileAtStamp(self._timeline.current_pos)
-		)
+		self._moveTo(self.timeline_index.previousStamp(selected_stamp))
 
 	def moveToNextFrame(self):
 		"""
 		Slides the cursor to the next frame. Does nothing if there is no frame
 		after the current position
 		"""
-		all_ts = [s for t in self.stamps_by_stream.values() for s in t]
-		all_ts.sort()
-		first_frame = all_ts[0]
+		if self._timeline.current_pos is None:
+			self._moveTo(self.timeline_index.nearestStamp(self._timeline._start_stamp))
+		else:
+			self._moveTo(self.timeline_index.nextStamp(self._timeline.current_pos))
+
+	def moveToPreviousStreamFrame(self, stream_name):
+		"""
+		Slides the cursor to the previous frame of a given stream. Does nothing
+		if this stream has no frame before the current position
 
-		selected_index = bisect.bisect_right(all_ts, self._timeline.current_pos)-1
-		if len(all_ts)-1 == selected_index:
-			# We are already at the last frame
+		:param stream_name: Stream to navigate in
+		:type stream_name: str
+		"""
+		if self._timeline.current_pos is None:
 			return
+		stream_index = self.stream_indexes[stream_name]
+		selected_stamp = stream_index.stampAt(self._timeline.current_pos)
+		if selected_stamp is None:
+			return
+		self._moveTo(
+		    self.timeline_index.previousStampOnStream(selected_stamp, stream_name)
+		)
 
-		# Move forward enough to be sure to reach the first frame
-		increase = 1
-		while all_ts[selected_index+increase] < first_frame:
-			increase += 1
+	def moveToNextStreamFrame(self, stream_name):
+		"""
+		Slides the cursor to the next frame of a given stream. Does nothing if
+		this stream has no frame after the current position
+
+		:param stream_name: Stream to navigate in
+		:type stream_name: str
+		"""
+		if self._timeline.current_pos is None:
+			self._moveTo(self.stream_indexes[stream_name].first_stamp)
+		else:
+			self._moveTo(
+			    self.timeline_index.nextStampOnStream(self._timeline.current_pos,
+			                                          stream_name)
+			)
+
+	def moveToNextSynchronizedFrame(self):
+		"""
+		Slides the cursor to the first position where every stream has a new
+		frame. Does nothing if a stream has no frame after the current
+		position
+		"""
+		if self._timeline.current_pos is None:
+			current_pos = self._timeline._start_stamp
+		else:
+			current_pos = self._timeline.current_pos
+		self._moveTo(self.timeline_index.nextSynchronizedStamp(current_pos))
 
-		self._timeline.current_pos = all_ts[selected_index+increase]
+	# ───────────
+	# Private API
+
+	def _restartPlaybackClock(self):
+		"""
+		Make playback continue from the current position, with the selected
+		playback mode
+		"""
+		self._playback_origin = (time.time(), self._timeline.current_pos)
+		self._playback_last_stamp = self._timeline.current_pos
+		mode, value = self.playback_mode
+		if mode == "fps":
+			self._playback_timer.setInterval(int(1000.0 / value))
+		else:
+			self._playback_timer.setInterval(PLAYBACK_TICK)
+
+	def _playbackTick(self):
+		"""
+		Move the cursor to the frame that must be displayed now. When playing
+		relatively to real time, frames which should have been displayed
+		since the previous tick are skipped.
+		"""
+		if self._timeline.current_pos != self._playback_last_stamp:
+			# The cursor was moved by the user, continue from there
+			self._restartPlaybackClock()
+
+		mode, value = self.playback_mode
+		if mode == "fps":
+			next_stamp = self.timeline_index.nextStamp(self._timeline.current_pos)
+		else:
+			origin_time, origin_stamp = self._playback_origin
+			target_stamp = origin_stamp\
+			               + int((time.time() - origin_time) * value * NSEC_PER_SEC)
+			next_stamp = self.timeline_index.stampAt(target_stamp)
+			if next_stamp == self.timeline_index.stampAt(self._timeline.current_pos):
+				# No new frame yet
+				next_stamp = self._timeline.current_pos
+
+		if next_stamp is None:
+			# End of timeline was reached
+			self.pause()
+			return
+		if next_stamp != self._timeline.current_pos:
+			self._moveTo(next_stamp)
+		self._playback_last_stamp = self._timeline.current_pos
+		if self.timeline_index.nextStamp(self._timeline.current_pos) is None:
+			self.pause()
+
+	def _appendToIndexes(self, stream_name, stream):
+		"""
+		Add new messages to the index of a stream and to the timeline index
+
+		:param stream_name: Name of the stream receiving the messages
+		:type stream_name: str
+		:param stream: Map from timestamps to file names of the new messages
+		:type stream: dict
+		"""
+		stream_index = self.stream_indexes.get(stream_name)
+		if stream_index is None:
+			# A new stream changes the stream numbering of the timeline
+			self.stream_indexes[stream_name] = StreamIndex(stream)
+			self.timeline_index = TimelineIndex(self.stream_indexes)
+			return
+		first_position = len(stream_index)
+		if stream_index.append(stream):
+			self.timeline_index.append(stream_name, first_position)
+		else:
+			self.timeline_index = TimelineIndex(self.stream_indexes)
+
+	def _streamsChanged(self):
+		"""
+		Update the timeline after the content of the streams changed. If the
+		cursor was on the latest message, it moves to the new latest one.
+		"""
+		self._streams = None
+		stick_to_end = self._scene.stick_to_end
+		self._updateTimelineBoundaries()
+		self._timeline.invalidate_static_layer()
+		if not stick_to_end or len(self.timeline_index) == 0:
+			return
+
+		# Keep the end of the timeline visible
+		span = self._timeline._stamp_right - self._timeline._stamp_left
+		self._timeline.set_visible_range(self._timeline._end_stamp - span,
+		                                 self._timeline._end_stamp)
+		last_stamp = self.timeline_index.stamps[-1]
+		if last_stamp != self._timeline.current_pos:
+			self._moveTo(last_stamp)
+
+	def _setLive(self, live):
+		"""
+		Start or stop following new messages
+
+		:param live: True to follow new messages
+		:type live: bool
+		"""
+		if not live:
+			self._live_timer.stop()
+			return
+		if len(self.timeline_index) > 0:
+			self._moveTo(self.timeline_index.stamps[-1])
+		self._live_timer.start()
+
+	def _updateThumbnail(self):
+		"""
+		Display the thumbnail of the hovered file if it is available, or
+		wait for it otherwise
+		"""
+		if self._hovered_file is None:
+			self._thumbnail_timer.stop()
+			return
+		thumbnail = self._thumbnails.get(self._hovered_file)
+		if thumbnail is None:
+			if self._thumbnails.isReady(self._hovered_file):
+				# Not an image, there is nothing to show
+				self._thumbnail_timer.stop()
+				self._thumbnail_label.hide()
+			elif not self._thumbnail_timer.isActive():
+				self._thumbnail_timer.start()
+			return
+
+		self._thumbnail_timer.stop()
+		self._thumbnail_label.setPixmap(QtGui.QPixmap.fromImage(thumbnail))
+		self._thumbnail_label.adjustSize()
+		self._thumbnail_label.move(self._hovered_pos + QtCore.QPoint(16, 16))
+		self._thumbnail_label.show()
+
+	def _moveTo(self, stamp):
+		"""
+		Slides the cursor to a timestamp and emits the file active there.
+		Does nothing if the stamp is None.
+
+		:param stamp: New position of the cursor
+		:type stamp: int
+		"""
+		if stamp is None:
+			return
+		self._timeline.current_pos = stamp
 		self.objectSelected.emit(
 		    self.getFileAtStamp(self._timeline.current_pos)
 		)
 
+	def _updateTimelineBoundaries(self):
+		"""
+		Recompute the time span covered by the timeline from the stream
+		indexes
+		"""
+		non_empty_indexes = [index for index in self.stream_indexes.values()\
+		                           if len(index) > 0]
+		if len(non_empty_indexes) == 0:
+			return
+		_start = int(min([index.first_stamp for index in non_empty_indexes]))
+		_last = int(max([index.last_stamp for index in non_empty_indexes]))
+		_end = _last+NSEC_PER_SEC
+
+		# Keep the current zoom, unless the whole timeline was displayed
+		show_all = self._timeline._stamp_left is None\
+		           or (self._timeline._stamp_left == self._timeline._start_stamp\
+		               and self._timeline._stamp_right == self._timeline._end_stamp)
+		self._timeline._start_stamp = _start
+		self._timeline._end_stamp = _end
+		self._timeline._last_stamp = _last
+		if show_all:
+			self._timeline.reset_zoom()
+		else:
+			self._timeline.set_visible_range(self._timeline._stamp_left,
+			                                 self._timeline._stamp_right)
+
 	# ─────
 	# Slots
 
 	def closeEvent(self, event):
+		self.hideThumbnail()
+		if self._thumbnails is not None:
+			self._thumbnails.close()
+			self._thumbnails = None
 		event.accept()
+
+	def eventFilter(self, watched, event):
+		if watched is self.view.viewport()\
+		   and event.type() == QtCore.QEvent.Gesture:
+			pinch = event.gesture(QtCore.Qt.PinchGesture)
+			if pinch is not None:
+				center = self._timeline.mapFromScene(
+				    self.view.mapToScene(
+				        self.view.viewport().mapFromGlobal(
+				            pinch.centerPoint().toPoint()
+				        )
+				    )
+				)
+				self._timeline.zoom(1.0/pinch.scaleFactor(),
+				                    self._timeline.map_x_to_stamp(center.x()))
+				event.accept(pinch)
+				return True
+		return QtGui.QWidget.eventFilter(self, watched, event)
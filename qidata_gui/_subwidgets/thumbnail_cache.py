@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017, Softbank Robotics Europe
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Standard libraries
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+import os
+
+# Third-party libraries
+import cv2
+from PySide import QtGui
+
+#: Maximum size of a thumbnail (width, height)
+THUMBNAIL_SIZE = (160, 120)
+
+#: Extension of the thumbnails saved on disk
+THUMBNAIL_EXTENSION = ".thumbnail.jpg"
+
+class ThumbnailCache(object):
+	"""
+	Bounded cache of small previews of image files.
+
+	Thumbnails are decoded at reduced resolution by a pool of worker threads,
+	so that requesting one never blocks. The most recently used ones are kept
+	in memory. If a cache folder is given, generated thumbnails are also
+	saved there and reused as long as they are newer than their file.
+	"""
+
+	# ───────────
+	# Constructor
+
+	def __init__(self, root_path, max_size=256, cache_dir=None, worker_count=2):
+		"""
+		ThumbnailCache constructor
+
+		:param root_path: Folder containing the files
+		:type root_path: str
+		:param max_size: Maximum number of thumbnails kept in memory
+		:type max_size: int
+		:param cache_dir: Folder where thumbnails are saved (optional)
+		:type cache_dir: str
+		:param worker_count: Number of decoding threads
+		:type worker_count: int
+		"""
+		self._root_path = root_path
+		self._max_size = max_size
+		self._cache_dir = cache_dir
+		self._pool = ThreadPool(worker_count)
+		self._max_pending = 2*worker_count
+		self._thumbnails = OrderedDict() # file name -> QImage, or None if not an image
+		self._pending = dict() # file name -> pending result
+
+	# ──────────
+	# Public API
+
+	def get(self, file_name):
+		"""
+		Return the thumbnail of a file. If it is not available, its
+		generation is requested and None is returned.
+
+		:param file_name: File to preview, relative to the root folder
+		:type file_name: str
+		:return: The thumbnail, None if it is not ready or if the file is not
+		         an image
+		:rtype: QtGui.QImage
+		"""
+		self._collectResults()
+		if file_name in self._thumbnails:
+			# Mark it as the most recently used
+			thumbnail = self._thumbnails.pop(file_name)
+			self._thumbnails[file_name] = thumbnail
+			return thumbnail
+		if file_name not in self._pending\
+		   and len(self._pending) < self._max_pending:
+			self._pending[file_name] = self._pool.apply_async(self._load,
+			                                                  (file_name,))
+		return None
+
+	def isReady(self, file_name):
+		"""
+		Tell if the thumbnail of a file was generated, or if it is known that
+		the file is not an image
+
+		:param file_name: File to preview, relative to the root folder
+		:type file_name: str
+		:rtype: bool
+		"""
+		self._collectResults()
+		return file_name in self._thumbnails
+
+	def close(self):
+		"""
+		Stop the decoding threads
+		"""
+		self._pool.close()
+		self._pool.join()
+		self._pending = dict()
+
+	# ───────────
+	# Private API
+
+	def _collectResults(self):
+		"""
+		Move the thumbnails generated by the workers to the cache
+		"""
+		for file_name in list(self._pending.keys()):
+			result = self._pending[file_name]
+			if not result.ready():
+				continue
+			self._pending.pop(file_name)
+			thumbnail = None
+			if result.successful() and result.get() is not None:
+				thumbnail = self._toQImage(result.get())
+			self._thumbnails[file_name] = thumbnail
+		while len(self._thumbnails) > self._max_size:
+			self._thumbnails.popitem(last=False)
+
+	def _load(self, file_name):
+		"""
+		Decode a thumbnail, from the disk cache if possible (runs in a worker)
+
+		:return: The thumbnail as a BGR array, None if the file is not an image
+		:rtype: numpy.ndarray
+		"""
+		file_path = os.path.join(self._root_path, file_name)
+		cache_path = None
+		if self._cache_dir is not None:
+			cache_path = os.path.join(self._cache_dir, file_name + THUMBNAIL_EXTENSION)
+			if os.path.exists(cache_path)\
+			   and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+				thumbnail = cv2.imread(cache_path, cv2.IMREAD_COLOR)
+				if thumbnail is not None:
+					return thumbnail
+
+		# Let the decoder skip most of the pixels
+		image = cv2.imread(file_path, cv2.IMREAD_REDUCED_COLOR_4)
+		if image is None:
+			return None
+		height, width = image.shape[:2]
+		scale = min(float(THUMBNAIL_SIZE[0]) / width,
+		            float(THUMBNAIL_SIZE[1]) / height,
+		            1.0)
+		thumbnail = cv2.resize(image,
+		                       (max(int(width*scale), 1), max(int(height*scale), 1)),
+		                       interpolation=cv2.INTER_AREA)
+
+		if cache_path is not None:
+			try:
+				if not os.path.isdir(os.path.dirname(cache_path)):
+					os.makedirs(os.path.dirname(cache_path))
+				cv2.imwrite(cache_path, thumbnail)
+			except OSError:
+				# The cache is optional, the thumbnail is still usable
+				pass
+		return thumbnail
+
+	def _toQImage(self, thumbnail):
+		"""
+		Convert a BGR array to a QImage
+
+		:param thumbnail: Thumbnail to convert
+		:type thumbnail: numpy.ndarray
+		:rtype: QtGui.QImage
+		"""
+		rgb = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2RGB)
+		height, width = rgb.shape[:2]
+		return QtGui.QImage(rgb.tostring(),
+		                    width,
+		                    height,
+		                    3*width,
+		                    QtGui.QImage.Format_RGB888).copy()
@@ -299,7 +299,7 @@ class QiDataFrameWidget(QtGui.QSplitter):
 				self.annotation_displayer.data = annotation
 
 			else:
-				item = self.frame_viewer.view.scene()._selectedItem
+				item = self.frame_viewer.scene[self.frame_viewer.plane]._selectedItem
 				annotator, annotation = item.info
 				location = item.coordinates
 				self.displayed_object.removeAnnotation(annotator,
@@ -431,6 +431,7 @@ class QiDataFrameWidget(QtGui.QSplitter):
 		settings.setValue("windowState", self.saveState())
 		settings.setValue("geometry/left", self.left_most_widget.saveGeometry())
 		settings.setValue("windowState/left", self.left_most_widget.saveState())
+		self.frame_viewer.close()
 		QtGui.QSplitter.closeEvent(self, event)
 		return True
 
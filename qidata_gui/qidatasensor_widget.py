@@ -42,6 +42,7 @@ from qidata_gui import RESOURCES_DIR
 from _subwidgets import TickableListWidget
 from _subwidgets import SelectableListWidget
 from _subwidgets import RawDataDisplayWidget
+from _subwidgets.file_cache import getFileCache
 
 import exceptions
 
@@ -160,7 +161,9 @@ class QiDataSensorWidget(QtGui.QSplitter):
 		self.raw_data_viewer = RawDataDisplayWidget(
 		                           self,
 		                           self.displayed_object.type,
-		                           self.displayed_object.raw_data
+		                           getFileCache().getOpenFile(
+		                               self.displayed_object
+		                           ).raw_data
 		                       )
 		self.raw_data_viewer.read_only = self._read_only
 		self.addWidget(self.raw_data_viewer)
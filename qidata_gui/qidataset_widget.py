@@ -29,6 +29,7 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 # Standard libraries
+from multiprocessing.pool import ThreadPool
 import os
 
 # Third-party libraries
@@ -43,6 +44,38 @@ from qidata_gui import RESOURCES_DIR
 from qidataframe_widget import QiDataFrameWidget
 from qidatasensor_widget import QiDataSensorWidget
 from _subwidgets import StreamViewer
+from _subwidgets.file_cache import getFileCache
+from _subwidgets.frame_prefetcher import FramePrefetcher
+from _subwidgets.stream_index import findNewMessages
+
+#: Number of files loaded in advance during stream playback
+PLAYBACK_LOOK_AHEAD = 8
+
+#: Interval between two checks of the end of a live refresh (ms)
+LIVE_REFRESH_POLL_INTERVAL = 20
+
+def _openForPlayback(file_path):
+	"""
+	Open a file in read-only mode and load its raw data in the file cache,
+	so that the decoding is done by the calling thread.
+	"""
+	getFileCache().get(file_path)
+	return qidata.open(file_path, "r")
+
+def _findNewMessages(qidataset, cursors):
+	"""
+	Examine the content of a dataset, then find the messages recorded in its
+	streams after the given cursors. This is done in a background thread,
+	as it depends on the size of the whole dataset.
+
+	:param qidataset: Opened QiDataSet
+	:param cursors: Map from stream names to the number of displayed messages
+	                and the stamp of the most recent one
+	:type cursors: dict
+	:return: see :func:`qidata_gui._subwidgets.stream_index.findNewMessages`
+	"""
+	qidataset.examineContent()
+	return findNewMessages(qidataset.getAllStreams(), cursors)
 
 class CentralWidget(QtGui.QSplitter):
 
@@ -71,17 +104,28 @@ class CentralWidget(QtGui.QSplitter):
 
 			# Display streams
 			self._stream_viewer = StreamViewer(
-			                                   self.qidataset.getAllStreams()
+			                                   self.qidataset.getAllStreams(),
+			                                   root_path=self.qidataset.name
 			                                  )
 			self.addWidget(
 			    self._stream_viewer
 			)
-			self._stream_viewer.objectSelected.connect(
-			    lambda x: "" if x is None\
-			                 else self.displaySensorData(
-			                     qidata.open(os.path.join(self.qidataset.name, x),"w")
-			                 )
+			self._stream_viewer.objectSelected.connect(self._displayStreamFile)
+			self._stream_viewer.playbackStateChanged.connect(
+			    self._playbackStateChanged
+			)
+			self._stream_viewer.liveRefreshRequested.connect(
+			    self._refreshLiveStreams
 			)
+			self._prefetcher = FramePrefetcher(
+			    lambda x: _openForPlayback(os.path.join(self.qidataset.name, x)),
+			    PLAYBACK_LOOK_AHEAD
+			)
+			self._live_pool = ThreadPool(1)
+			self._live_refresh = None
+			self._live_refresh_timer = QtCore.QTimer(self)
+			self._live_refresh_timer.setInterval(LIVE_REFRESH_POLL_INTERVAL)
+			self._live_refresh_timer.timeout.connect(self._collectLiveStreams)
 
 	def displaySensorData(self, qidatasensorobject):
 		"""
@@ -146,16 +190,114 @@ class CentralWidget(QtGui.QSplitter):
 			    )
 			)
 
+	def refreshStreams(self):
+		"""
+		Displays the messages added to the dataset streams since the last
+		refresh.
+		"""
+		if self._sub_widget_location == 0:
+			# No stream viewer
+			return
+		self._stream_viewer.refreshStreams(self.qidataset.getAllStreams())
+
 	def hideSubWidget(self):
 		if self._displayed_object is not None:
 			# If there is already a displayed frame, remove it
 			w = self.widget(self._sub_widget_location)
+			if isinstance(self._displayed_object, qidata.QiDataFrame):
+				w.close() # stop loading the frame
 			w.setParent(None) # take it out of the view
 			w.deleteLater() # destroy it
 			if isinstance(self._displayed_object, QiDataSensorObject):
 				self._displayed_object.close()
 			self._displayed_object = None
 
+	# ───────────
+	# Private API
+
+	def _displayStreamFile(self, file_name):
+		"""
+		Display a file selected on the stream viewer.
+
+		During playback, files are taken from the files loaded in advance.
+		If the file is not loaded yet, it is skipped instead of blocking the
+		interface.
+
+		:param file_name: Name of the file, relative to the dataset
+		:type file_name: str
+		"""
+		if not file_name:
+			return
+		if not self._stream_viewer.playing:
+			self.displaySensorData(
+			    qidata.open(os.path.join(self.qidataset.name, file_name),"w")
+			)
+			return
+
+		qidata_file = self._prefetcher.take(file_name)
+		self._prefetcher.prefetch(
+		    self._stream_viewer.getUpcomingFiles(PLAYBACK_LOOK_AHEAD)
+		)
+		if qidata_file is not None:
+			self.displaySensorData(qidata_file)
+			if qidata_file is not self._displayed_object:
+				# The same file was already displayed
+				qidata_file.close()
+
+	def _refreshLiveStreams(self):
+		"""
+		Start looking, in background, for the files recorded in the dataset
+		since the last refresh
+		"""
+		if self._live_refresh is not None:
+			# The previous refresh is not over yet
+			return
+		self._live_refresh = self._live_pool.apply_async(
+		    _findNewMessages,
+		    (self.qidataset, self._stream_viewer.getStreamCursors())
+		)
+		self._live_refresh_timer.start()
+
+	def _collectLiveStreams(self):
+		"""
+		Add the files found by the live refresh to the displayed streams
+		"""
+		if not self._live_refresh.ready():
+			return
+		self._live_refresh_timer.stop()
+		live_refresh = self._live_refresh
+		self._live_refresh = None
+		self._stream_viewer.addMessages(*live_refresh.get())
+
+	def _playbackStateChanged(self, playing):
+		if playing:
+			self._prefetcher.prefetch(
+			    self._stream_viewer.getUpcomingFiles(PLAYBACK_LOOK_AHEAD)
+			)
+			return
+
+		# Files are displayed in read-only mode during playback. Once paused,
+		# display the current file again so that it can be annotated.
+		self._prefetcher.clear()
+		self.hideSubWidget()
+		self._displayStreamFile(self._stream_viewer.current_file)
+
+	# ─────
+	# Slots
+
+	def closeEvent(self, event):
+		self.hideSubWidget()
+		if self._sub_widget_location != 0:
+			# Stop the threads loading upcoming files and close loaded files
+			self._prefetcher.close()
+			# Stop the threads decoding thumbnails
+			self._stream_viewer.close()
+			# Stop looking for new files
+			self._live_refresh_timer.stop()
+			self._live_pool.close()
+			self._live_pool.join()
+		QtGui.QSplitter.closeEvent(self, event)
+
 class QiDataSetWidget(QtGui.QSplitter):
 	"""
 	Widget specialized in displaying a dataset content
@@ -347,6 +489,7 @@ class QiDataSetWidget(QtGui.QSplitter):
 
 	def _refreshDataset(self):
 		self.qidataset.examineContent()
+		self.central_widget.refreshStreams()
 		self._refreshGuiContent()
 
 	def _refreshGuiContent(self):
@@ -426,5 +569,6 @@ class QiDataSetWidget(QtGui.QSplitter):
 		# settings.setValue("windowState", self.saveState())
 		# settings.setValue("geometry/left", self.left_most_widget.saveGeometry())
 		# settings.setValue("windowState/left", self.left_most_widget.saveState())
+		self.central_widget.close()
 		QtGui.QSplitter.closeEvent(self, event)
 		return True
\ No newline at end of file
@@ -50,6 +50,13 @@ def test_qidataframe_widget_read_only(qtbot, dataset_with_frame_path):
 		assert(widget.frame_viewer.read_only)
 		assert(widget.annotation_displayer.read_only)
 
+		# Files are decoded in background and shown once ready
+		while not widget.frame_viewer.isReady():
+			qtbot.wait(10)
+		assert(len(frame_0.files) == len(widget.frame_viewer.raw_data_to_files_map))
+		# Every cell reserved for a file was filled
+		assert(dict() == widget.frame_viewer._cells)
+
 def test_qidataframe_widget_addition(qtbot, mock, dataset_with_frame_path, dataset_with_frame_and_tf_path):
 
 	# Create widget in "w" mode
@@ -151,6 +158,11 @@ def test_qidataframe_widget_addition(qtbot, mock, dataset_with_frame_path, datas
 		widget.show()
 		qtbot.addWidget(widget)
 
+		# Wait for the point cloud, built in background
+		while not widget.frame_viewer.isReady():
+			qtbot.wait(10)
+		assert(len(widget.frame_viewer.pts_3d) > 0)
+
 		# Create a new localized annotation
 		qtbot.mouseClick(widget.frame_viewer.view.viewport(),
 		                 QtCore.Qt.LeftButton,
@@ -249,4 +261,16 @@ def test_qidataframe_widget_addition(qtbot, mock, dataset_with_frame_path, datas
 		    ] == _f.annotations["jsmith"]["Object"][1]
 		)
 
-		assert(2 == len(_f.annotations["jsmith"]["Object"]))
\ No newline at end of file
+		assert(2 == len(_f.annotations["jsmith"]["Object"]))
+
+def test_qidataframe_widget_close(qtbot, dataset_with_frame_and_tf_path):
+	with qidata.QiDataSet(dataset_with_frame_and_tf_path, "r") as _ds:
+		widget = QiDataFrameWidget(_ds, _ds.getAllFrames()[0])
+		widget.show()
+		qtbot.addWidget(widget)
+
+		# Closing the frame stops building its point cloud
+		widget.close()
+		job = widget.frame_viewer._point_cloud_job
+		assert(not widget.frame_viewer._loading_timer.isActive())
+		assert(job is None or job.isCancelled())
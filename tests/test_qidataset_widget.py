@@ -26,6 +26,10 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+# Standard libraries
+import os
+import shutil
+
 # Third-party libraries
 from PySide import QtCore, QtGui
 from PySide.QtCore import Qt
@@ -147,3 +151,49 @@ def test_qidataset_stream(mock, qtbot, big_dataset_path):
 		widget.show()
 		qtbot.addWidget(widget)
 		assert(widget._has_streams)
+
+def test_qidataset_stream_close(mock, qtbot, big_dataset_path):
+	with qidata.QiDataSet(big_dataset_path, "w") as _ds:
+		widget = QiDataSetWidget(_ds)
+		widget.show()
+		qtbot.addWidget(widget)
+		prefetcher = widget.central_widget._prefetcher
+		prefetcher.prefetch(
+		    widget.central_widget._stream_viewer.getUpcomingFiles(2)
+		)
+
+		# Closing the dataset widget releases the files loaded in advance
+		assert(widget.closeEvent(QtGui.QCloseEvent()))
+		assert(0 == len(prefetcher._buffer))
+		assert([] == prefetcher._discarded)
+		assert(widget.central_widget._stream_viewer._thumbnails is None)
+
+def test_qidataset_stream_live_refresh(mock, qtbot, big_dataset_path):
+	with qidata.QiDataSet(big_dataset_path, "w") as _ds:
+		widget = QiDataSetWidget(_ds)
+		widget.show()
+		qtbot.addWidget(widget)
+		stream_viewer = widget.central_widget._stream_viewer
+		message_count = len(stream_viewer.stream_indexes["ir"])
+		end_stamp = stream_viewer.stream_indexes["ir"].last_stamp
+
+		# Record a new file in the open dataset
+		shutil.copyfile(
+		    os.path.join(big_dataset_path, "ir_51.png"),
+		    os.path.join(big_dataset_path, "ir_52.png")
+		)
+		with qidata.open(os.path.join(big_dataset_path, "ir_52.png"), "w") as _f:
+			_f.type = "IMAGE_IR"
+			_f.timestamp.seconds = 1455891954
+			_f.timestamp.nanoseconds = 0
+		_ds.addToStream("ir", ((1455891954, 0), "ir_52.png"))
+
+		# The next live refresh adds it to the timeline
+		stream_viewer.liveRefreshRequested.emit()
+		qtbot.waitUntil(
+		    lambda: message_count < len(stream_viewer.stream_indexes["ir"]),
+		    timeout=5000
+		)
+		assert(message_count + 1 == len(stream_viewer.stream_indexes["ir"]))
+		assert(end_stamp < stream_viewer.stream_indexes["ir"].last_stamp)
+		assert("ir_52.png" == stream_viewer.stream_indexes["ir"].files[-1])
@@ -26,6 +26,10 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+# Standard libraries
+import os
+import time
+
 # Third-party libraries
 from PySide import QtCore, QtGui
 from pytestqt.exceptions import TimeoutError
@@ -33,6 +37,189 @@ import qidata
 
 # Local modules
 from qidata_gui._subwidgets import StreamViewer
+from qidata_gui._subwidgets.frame_prefetcher import FramePrefetcher
+from qidata_gui._subwidgets.stream_index import NSEC_PER_SEC as S
+from qidata_gui._subwidgets.stream_index import (
+                                                 findNewMessages,
+                                                 StreamIndex,
+                                                 TimelineIndex,
+                                                )
+from qidata_gui._subwidgets.thumbnail_cache import ThumbnailCache
+
+class FakeLoadedFile(object):
+	"""
+	Loaded file recording whether it was closed
+	"""
+	def __init__(self, name):
+		self.name = name
+		self.closed = False
+	def close(self):
+		self.closed = True
+
+class FakeLoader(object):
+	"""
+	File loader recording the files it loaded
+	"""
+	def __init__(self):
+		self.loaded_files = []
+	def load(self, name):
+		self.loaded_files.append(FakeLoadedFile(name))
+		return self.loaded_files[-1]
+
+def waitUntil(condition, timeout=5.0):
+	"""
+	Wait until a condition is true, failing after the timeout (in seconds)
+	"""
+	deadline = time.time() + timeout
+	while not condition():
+		assert(time.time() < deadline)
+		time.sleep(0.01)
+
+def test_stream_index():
+	index = StreamIndex({(2,500000000):"b.png", (1,0):"a.png", (3,0):"c.png"})
+	assert(3 == len(index))
+	assert([(1,0), (2,500000000), (3,0)] == index.keys)
+	assert(["a.png", "b.png", "c.png"] == index.files)
+	assert(1*S == index.first_stamp)
+	assert(3*S == index.last_stamp)
+
+	assert(-1 == index.indexAt(S//2))
+	assert(1 == index.indexAt(2*S+S//2))
+	assert(2 == index.indexAt(3*S))
+	assert(index.stampAt(S//2) is None)
+	assert(2*S+S//2 == index.stampBefore(3*S))
+	assert(index.stampBefore(1*S) is None)
+	assert(3*S == index.stampAfter(2*S+S//2))
+	assert(index.stampAfter(3*S) is None)
+
+	assert([1, 0, 1, 1] == index.density(1*S, 3*S+S//2, 4).tolist())
+	assert([0, 0] == index.density(4*S, 5*S, 2).tolist())
+
+	# Stamps are exact, even far from the epoch
+	index = StreamIndex({(1500000000,1):"a.png", (1500000000,2):"b.png"})
+	assert(1500000000*S+2 == index.stampAfter(1500000000*S+1))
+	assert([(1500000000,1), (1500000000,2)] == index.keys)
+
+	# Keys are built once, and again after new messages are appended
+	assert(index.keys is index.keys)
+	index.append({(1500000000,3):"c.png"})
+	assert([(1500000000,1), (1500000000,2), (1500000000,3)] == index.keys)
+
+def test_find_new_messages():
+	streams = {
+	    "a": {(1,0):"a1.png", (2,0):"a2.png", (3,0):"a3.png"},
+	    "b": {(1,0):"b1.png", (2,0):"b2.png"},
+	    "c": {(1,0):"c1.png"},
+	    "d": {(1,0):"d1.png"},
+	}
+	cursors = {"a": (2, 2*S), "b": (1, 2*S), "c": (1, 1*S)}
+	new_messages, rebuilt_streams = findNewMessages(streams, cursors)
+
+	# Only messages after the cursor are returned, unchanged streams are
+	# skipped, and streams changed in the past must be indexed again
+	assert({"a": {(3,0):"a3.png"}, "d": {(1,0):"d1.png"}} == new_messages)
+	assert({"b": streams["b"]} == rebuilt_streams)
+
+def test_stream_index_density_pyramid():
+	stream = dict([((i//1000, (i%1000)*1000000), "%d.png"%i) for i in range(100000)])
+	index = StreamIndex(stream)
+
+	# Zoomed out, the counts come from the pyramid and must remain accurate
+	density = index.density(0, 100*S, 50)
+	assert(100000 == density.sum())
+	assert(all(abs(d - 2000) <= 2000/4 for d in density))
+
+	# Zoomed in, stamps are counted directly
+	assert([1]*10 == index.density(10*S, 10*S+S//100, 10).tolist())
+
+def test_stream_index_append():
+	stream = dict([((i//1000, (i%1000)*1000000), "%d.png"%i) for i in range(100000)])
+	keys = sorted(stream.keys())
+	index = StreamIndex(dict([(k, stream[k]) for k in keys[:1000]]))
+	index.density(0, 1*S, 10) # Build the density pyramid
+	for start in range(1000, 100000, 9000):
+		assert(index.append(dict([(k, stream[k]) for k in keys[start:start+9000]])))
+
+	# Appending gives the same index as building it at once
+	full_index = StreamIndex(stream)
+	assert(full_index.stamps.tolist() == index.stamps.tolist())
+	assert(full_index.files == index.files)
+	assert(full_index.density(0, 100*S, 50).tolist()\
+	           == index.density(0, 100*S, 50).tolist())
+
+	# Messages older than the last one lead to a rebuild
+	assert(not index.append({(0,500):"old.png"}))
+	assert("old.png" == index.files[1])
+
+def test_stream_index_statistics():
+	# 10 Hz stream, missing the messages at 0.3 and 0.4s
+	index = StreamIndex(dict([((0, i*100000000), "%d.png"%i) for i in [0,1,2,5,6]]))
+	statistics = index.statistics()
+	assert(5 == statistics["count"])
+	assert(6*S//10 == statistics["duration"])
+	assert(abs(10.0 - statistics["median_rate"]) < 1e-9)
+	assert(abs(4/0.6 - statistics["mean_rate"]) < 1e-9)
+	assert(0.0 == statistics["jitter"][50])
+
+	assert([[2*S//10, 5*S//10]] == index.gaps(S//5).tolist())
+	assert([] == index.gaps(S//5, 5*S//10, S).tolist())
+	assert([] == index.gaps(S//2).tolist())
+
+	assert(StreamIndex({(0,0):"a.png"}).statistics()["median_rate"] is None)
+
+def test_timeline_index():
+	index = TimelineIndex({
+	    "a": StreamIndex({(1,0):"a1.png", (3,0):"a3.png", (5,0):"a5.png"}),
+	    "b": StreamIndex({(2,0):"b2.png", (3,0):"b3.png", (4,0):"b4.png"}),
+	})
+	assert(6 == len(index))
+	assert([1*S, 2*S, 3*S, 3*S, 4*S, 5*S] == index.stamps.tolist())
+	assert(["a1.png", "b2.png", "a3.png", "b3.png", "b4.png", "a5.png"]\
+	           == [index.fileAt(i) for i in range(len(index))])
+
+	assert("b3.png" == index.fileAt(index.indexAt(3*S+S//2)))
+	assert(-1 == index.indexAt(S//2))
+	assert(4*S == index.nextStamp(3*S))
+	assert(index.nextStamp(5*S) is None)
+	assert(2*S == index.previousStamp(3*S))
+	assert(index.previousStamp(1*S) is None)
+	assert(4*S == index.nearestStamp(3*S+S*6//10))
+	assert(1*S == index.nearestStamp(-10*S))
+
+	assert(5*S == index.nextStampOnStream(3*S, "a"))
+	assert(2*S == index.previousStampOnStream(3*S, "b"))
+	assert(3*S == index.nextSynchronizedStamp(2*S+S//2))
+	assert(index.nextSynchronizedStamp(4*S) is None)
+
+	# New messages are merged in the timeline
+	index.stream_indexes["b"].append({(4,500000000):"b45.png", (6,0):"b6.png"})
+	index.append("b", 3)
+	assert([1*S, 2*S, 3*S, 3*S, 4*S, 4*S+S//2, 5*S, 6*S] == index.stamps.tolist())
+	assert(["b45.png", "a5.png", "b6.png"]\
+	           == [index.fileAt(i) for i in range(5, len(index))])
+
+def test_timeline_index_synchronization():
+	index = TimelineIndex({
+	    "a": StreamIndex(dict([((i,0), "a%d.png"%i) for i in range(5)])),
+	    "b": StreamIndex(dict([((i,10000000), "b%d.png"%i) for i in range(5)])),
+	    "c": StreamIndex({(1,20000000):"c1.png", (3,200000000):"c3.png"}),
+	})
+	assert([1, 1] == index.synchronizedPositionsAt(S, ["a", "b"], S//50))
+	assert(index.synchronizedPositionsAt(S, ["a", "b"], S//200) is None)
+
+	# "c" has the fewest messages, it is used as reference
+	positions = index.synchronizedPositions(["a", "b", "c"], S//20)
+	assert([[1, 1, 0]] == positions.tolist())
+	positions = index.synchronizedPositions(["a", "b", "c"], S//4)
+	assert([[1, 1, 0], [3, 3, 1]] == positions.tolist())
+
+	# Stamps shared by several streams select each set once
+	index = TimelineIndex({
+	    "a": StreamIndex({(1,0):"a1.png", (2,0):"a2.png"}),
+	    "b": StreamIndex({(1,0):"b1.png", (2,0):"b2.png"}),
+	})
+	positions = index.synchronizedPositions(["a", "b"], 0, index.stamps)
+	assert([[0, 0], [1, 1]] == positions.tolist())
 
 def test_stream_viewer(qtbot, big_dataset_path):
 
@@ -113,3 +300,151 @@ def test_stream_viewer(qtbot, big_dataset_path):
 
 			assert(previous_file != _s.args[0])
 			previous_set = _s.args[0]
+
+def test_stream_viewer_zoom(qtbot, big_dataset_path):
+	with qidata.QiDataSet(big_dataset_path, "r") as _ds:
+		widget = StreamViewer(_ds.getAllStreams())
+		qtbot.addWidget(widget)
+		widget.show()
+		qtbot.waitUntil(widget.isVisible, 100)
+
+		timeline = widget._timeline
+		start, end = timeline._start_stamp, timeline._end_stamp
+		assert((start, end) == (timeline._stamp_left, timeline._stamp_right))
+
+		# Zooming keeps the center stamp in place
+		center = (start + end) // 2
+		timeline.zoom(0.5, center)
+		assert(abs((timeline._stamp_right - timeline._stamp_left) - (end - start)//2) <= 1)
+		assert(abs((timeline._stamp_left + timeline._stamp_right)//2 - center) <= 1)
+
+		# Panning cannot go beyond the timeline boundaries
+		timeline.pan(-(end - start))
+		assert(start == timeline._stamp_left)
+		timeline.pan(2*(end - start))
+		assert(end == timeline._stamp_right)
+
+		# The fit button shows the whole timeline again
+		qtbot.mouseClick(widget.fit_button, QtCore.Qt.LeftButton)
+		assert((start, end) == (timeline._stamp_left, timeline._stamp_right))
+
+def test_stream_viewer_playback(qtbot, big_dataset_path):
+	with qidata.QiDataSet(big_dataset_path, "r") as _ds:
+		widget = StreamViewer(_ds.getAllStreams())
+		qtbot.addWidget(widget)
+		widget.show()
+		qtbot.waitUntil(widget.isVisible, 100)
+
+		widget.speed_selector.setCurrentIndex(
+		    widget.speed_selector.findText("30 fps")
+		)
+		with qtbot.waitSignal(widget.playbackStateChanged, timeout=500) as _s:
+			qtbot.mouseClick(widget.play_button, QtCore.Qt.LeftButton)
+		assert(_s.args[0])
+		assert(widget.playing)
+		assert("depth_00.png" == widget.current_file)
+
+		# At 30 fps, each tick selects the next frame
+		with qtbot.waitSignal(widget.objectSelected, timeout=500) as _s:
+			pass
+		assert("ir_00.png" == _s.args[0])
+		assert(len(widget.getUpcomingFiles(4)) == 4)
+
+		with qtbot.waitSignal(widget.playbackStateChanged, timeout=500) as _s:
+			qtbot.mouseClick(widget.play_button, QtCore.Qt.LeftButton)
+		assert(not _s.args[0])
+		assert(not widget.playing)
+
+		# Playback stops by itself at the end of the timeline
+		widget.speed_selector.setCurrentIndex(
+		    widget.speed_selector.findText("16x")
+		)
+		with qtbot.waitSignal(widget.playbackStateChanged, timeout=10000) as _s:
+			widget.play()
+		with qtbot.waitSignal(widget.playbackStateChanged, timeout=10000) as _s:
+			pass
+		assert(not widget.playing)
+		assert("ir_51.png" == widget.current_file)
+
+def test_stream_viewer_live(qtbot):
+	widget = StreamViewer({"a": {(1,0):"a1.png", (2,0):"a2.png"}})
+	qtbot.addWidget(widget)
+	widget.show()
+	qtbot.waitUntil(widget.isVisible, 100)
+
+	# Following the streams moves the cursor to the latest message
+	with qtbot.waitSignal(widget.objectSelected, timeout=500) as _s:
+		widget.live = True
+	assert("a2.png" == _s.args[0])
+
+	# The cursor sticks to the end as new messages are received
+	with qtbot.waitSignal(widget.objectSelected, timeout=500) as _s:
+		widget.refreshStreams({
+		    "a": {(1,0):"a1.png", (2,0):"a2.png", (3,0):"a3.png"},
+		    "b": {(2,500000000):"b25.png"},
+		})
+	assert("a3.png" == _s.args[0])
+	assert(4*S == widget._timeline._end_stamp)
+
+	# Once the user seeks away, the cursor stays in place
+	widget.moveToPreviousFrame()
+	with qtbot.assertNotEmitted(widget.objectSelected):
+		widget.appendToStream("b", {(4,0):"b4.png"})
+	assert("b25.png" == widget.current_file)
+	widget.live = False
+
+def test_stream_viewer_synchronization(qtbot):
+	widget = StreamViewer({
+	    "a": {(1,0):"a1.png", (2,0):"a2.png"},
+	    "b": {(1,1000):"b1.png", (2,500000000):"b2.png"},
+	})
+	qtbot.addWidget(widget)
+	assert(["a1.png", "b1.png"] == widget.getSynchronizedFilesAtStamp(S, S//1000))
+	assert([] == widget.getSynchronizedFilesAtStamp(2*S, S//1000))
+	assert([("a1.png", "b1.png")] == widget.getSynchronizedFiles(S//1000))
+	assert([("b1.png",)] == widget.getSynchronizedFiles(0, ["b"])[:1])
+
+def test_thumbnail_cache(big_dataset_path):
+	cache_dir = os.path.join(big_dataset_path, ".thumbnails")
+	cache = ThumbnailCache(big_dataset_path, max_size=1, cache_dir=cache_dir)
+	assert(cache.get("ir_00.png") is None)
+	while not cache.isReady("ir_00.png"):
+		time.sleep(0.01)
+	thumbnail = cache.get("ir_00.png")
+	assert(thumbnail.width() <= 160 and thumbnail.height() <= 120)
+	assert(os.path.exists(os.path.join(cache_dir, "ir_00.png.thumbnail.jpg")))
+
+	# Only the most recently used thumbnail is kept
+	cache.get("ir_01.png")
+	while not cache.isReady("ir_01.png"):
+		time.sleep(0.01)
+	assert(not cache.isReady("ir_00.png"))
+	cache.close()
+
+def test_frame_prefetcher():
+	loader = FakeLoader()
+	prefetcher = FramePrefetcher(loader.load, max_size=2)
+	prefetcher.prefetch(["a", "b", "c"])
+	waitUntil(lambda: prefetcher.isReady("a") and prefetcher.isReady("b"))
+	assert(not prefetcher.isReady("c"))
+	assert(prefetcher.take("c") is None)
+	assert("a" == prefetcher.take("a").name)
+	assert(prefetcher.take("a") is None)
+
+	# Files not requested anymore are closed
+	prefetcher.prefetch(["c"])
+	waitUntil(lambda: prefetcher.isReady("c"))
+	prefetcher.close()
+	assert(["a", "b", "c"] == sorted([f.name for f in loader.loaded_files]))
+	assert(all([f.closed for f in loader.loaded_files if f.name != "a"]))
+
+def test_frame_prefetcher_close():
+	# Files still in the buffer are closed with the prefetcher
+	loader = FakeLoader()
+	prefetcher = FramePrefetcher(loader.load, max_size=2)
+	prefetcher.prefetch(["a", "b"])
+	waitUntil(lambda: prefetcher.isReady("a") and prefetcher.isReady("b"))
+	prefetcher.close()
+	assert(2 == len(loader.loaded_files))
+	assert(all([f.closed for f in loader.loaded_files]))
+	assert(prefetcher.take("a") is None)
@@ -27,21 +27,38 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 # Standard libraries
+import os
 import threading
 import time
 
 # Third-party libraries
 import cv2
 from image import Image
+import numpy
 from PySide import QtCore, QtGui
 from pymouse import PyMouse
 import pytest
+import qidata
 
 # Local modules
 from qidata_gui._subwidgets import (
                                     SelectableListWidget,
                                     TickableListWidget,
                                    )
+from qidata_gui._subwidgets.calibration_cache import CalibrationCache
+from qidata_gui._subwidgets.file_cache import FileCache
+from qidata_gui._subwidgets.point_cloud import (
+                                                backProject,
+                                                colorize,
+                                                downsample,
+                                                fuse,
+                                                getRayGrid,
+                                                orbitRotation,
+                                                planeRotation,
+                                                PointCloudLOD,
+                                                randomSubsample,
+                                                rasterize,
+                                               )
 from qidata_gui._subwidgets.raw_data_display_widgets import RawDataDisplayWidget
 
 def mouseDrag(qtbot, source, dest):
@@ -443,3 +460,167 @@ def test_raw_data_display_widget(qtbot, jpg_file_path):
 	         )
 	mouseDrag(qtbot,(from_pos.x(),from_pos.y()),(to_pos.x(), to_pos.y()))
 	assert([[170,170],[310,310]] == i4.coordinates)
+
+def test_point_cloud_back_projection():
+	camera_matrix = [[2.0, 0.0, 1.0], [0.0, 2.0, 1.0], [0.0, 0.0, 1.0]]
+	distortion_coeffs = [0.0, 0.0, 0.0, 0.0, 0.0]
+	ray_grid = getRayGrid(camera_matrix, distortion_coeffs, 3, 2)
+	assert((2, 3, 2) == ray_grid.shape)
+	assert(numpy.allclose([0.5, 0.0], ray_grid[1, 2]))
+	# Same calibration, same grid
+	assert(ray_grid is getRayGrid(camera_matrix, distortion_coeffs, 3, 2))
+
+	depth = numpy.array([[0, 1000, 2000], [0, 0, 4000]], dtype=numpy.uint16)
+	points = backProject(depth, ray_grid, 0.001)
+	assert((4, 3) == points.shape)
+	assert(numpy.allclose([0.0, -0.5, 1.0, 1.0], points[:, 0]))
+	assert(numpy.allclose([2.0, 0.0, 4.0, 1.0], points[:, 2]))
+
+def test_point_cloud_colorization():
+	camera_matrix = [[1.0, 0.0, 1.0], [0.0, 1.0, 1.0], [0.0, 0.0, 1.0]]
+	image = numpy.arange(27, dtype=numpy.uint8).reshape((3, 3, 3))
+	# Two points seen by the central pixel, and one outside of the image
+	points = numpy.array([[0, 0, 1, 1], [0, 0, 3, 1], [5, 0, 1, 1]], dtype=float).T
+
+	colors = colorize(points, image, camera_matrix, numpy.eye(4))
+	assert(numpy.uint8 == colors.dtype)
+	assert([[12, 13, 14], [12, 13, 14], [0, 0, 0]] == colors.tolist())
+
+	colors = colorize(points, image, camera_matrix, numpy.eye(4), z_buffer=True)
+	assert([[12, 13, 14], [0, 0, 0], [0, 0, 0]] == colors.tolist())
+
+def test_point_cloud_fusion():
+	first = numpy.array([[0, 0, 0, 1], [0.01, 0, 0, 1], [0.2, 0, 0, 1]]).T
+	second = numpy.array([[0.005, 0.001, 0, 1], [-1, 2, 3, 1]]).T
+
+	assert((4, 5) == fuse([first, second]).shape)
+	assert((4, 0) == fuse([]).shape)
+	fused = fuse([first, second], voxel_size=0.05)
+	assert([[0, 0, 0, 1], [0.2, 0, 0, 1], [-1, 2, 3, 1]] == fused.T.tolist())
+
+def test_point_cloud_rasterization():
+	points = numpy.array([[0, 0, 0], [0, 0, 1], [0.02, 0.01, 0]],
+	                     dtype=numpy.float32)
+	colors = numpy.array([[1, 1, 1], [2, 2, 2], [3, 3, 3]], dtype=numpy.uint8)
+
+	# Looking along -z, the point at z=0 is in front of the one at z=1
+	image, x_min, y_min, scale = rasterize(points, colors, "+0-1-2", 100)
+	assert((0, -1, 1) == (x_min, y_min, scale))
+	assert((2, 3, 4) == image.shape)
+	assert([[0, 0, 3], [1, 0, 0]] == image[:, :, 0].tolist())
+	assert([[0, 0, 255], [255, 0, 0]] == image[:, :, 3].tolist())
+
+	image, _, _, _ = rasterize(points, colors, "+0-1+2", 100)
+	assert(2 == image[1, 0, 0])
+
+	# Far apart points are drawn at a lower resolution
+	clusters = numpy.array([[0, 0, 0], [50, 0, 0]], dtype=numpy.float32)
+	image, x_min, y_min, scale = rasterize(clusters, colors[:2], "+0-1-2", 100)
+	assert((0, 0, 2) == (x_min, y_min, scale))
+	assert((1, 2501, 4) == image.shape)
+	assert([255, 255] == image[0, [0, -1], 3].tolist())
+
+	# Any rotation can be used
+	image, _, _, _ = rasterize(points, colors, planeRotation("+0-1-2"), 100)
+	assert([[0, 0, 3], [1, 0, 0]] == image[:, :, 0].tolist())
+	assert(numpy.allclose(planeRotation("-1-2-0"), orbitRotation(0, 0)))
+	# Turning by half a turn shows the points from the other side
+	assert(numpy.allclose(planeRotation("+1-2+0"), orbitRotation(numpy.pi, 0)))
+
+def test_calibration_cache(tmpdir):
+	camera_matrix = [[2.0, 0.0, 1.0], [0.0, 2.0, 1.0], [0.0, 0.0, 1.0]]
+	distortion_coeffs = [0.1, 0.0, 0.0, 0.0, 0.0]
+	cache = CalibrationCache(max_size=2, cache_dir=str(tmpdir))
+
+	m1, m2 = cache.getUndistortionMaps(camera_matrix, distortion_coeffs, 4, 3)
+	assert((3, 4) == m1.shape)
+	maps = cache.getUndistortionMaps(camera_matrix, distortion_coeffs, 4, 3)
+	assert(m1 is maps[0])
+
+	# The least recently used tables are evicted
+	cache.getRayGrid(camera_matrix, distortion_coeffs, 4, 3)
+	cache.getRayGrid(camera_matrix, distortion_coeffs, 8, 6)
+	maps = cache.getUndistortionMaps(camera_matrix, distortion_coeffs, 4, 3)
+	assert(m1 is not maps[0])
+
+	# And reloaded from disk by another cache
+	assert(3 == len(tmpdir.listdir()))
+	other_cache = CalibrationCache(cache_dir=str(tmpdir))
+	assert(numpy.array_equal(
+	    m2,
+	    other_cache.getUndistortionMaps(camera_matrix, distortion_coeffs, 4, 3)[1]
+	))
+
+def test_file_cache(jpg_file_path):
+	cache = FileCache(max_size=2)
+	loaded_file = cache.get(jpg_file_path)
+	assert(loaded_file.raw_data.height == loaded_file.raw_data.numpy_image.shape[0])
+	assert(loaded_file.raw_data.numpy_image.nbytes == loaded_file.size)
+	assert(loaded_file is cache.get(jpg_file_path))
+
+	# A modified file is read again
+	mtime = os.path.getmtime(jpg_file_path)
+	os.utime(jpg_file_path, (mtime+10, mtime+10))
+	assert(loaded_file is not cache.get(jpg_file_path))
+
+	# The last read file is kept, even beyond the allowed memory
+	cache.max_bytes = 0
+	cache.clear()
+	loaded_file = cache.get(jpg_file_path)
+	assert(loaded_file is cache.get(jpg_file_path))
+
+	# Files can be read in background
+	cache.clear()
+	pending_file = cache.getAsync(jpg_file_path)
+	pending_file.waitForMetadata()
+	assert(pending_file.transform is not None)
+	loaded_file = pending_file.get()
+	assert(pending_file.isReady())
+	assert(pending_file.type == loaded_file.type)
+	assert(loaded_file is cache.get(jpg_file_path))
+
+	# The metadata of several files are known before they are decoded
+	cache.clear()
+	pending_files = cache.getAllAsync([jpg_file_path, jpg_file_path])
+	assert(2 == len(pending_files))
+	for pending_file in pending_files:
+		pending_file.waitForMetadata()
+		assert(loaded_file.type == pending_file.type)
+		assert(pending_file.get().raw_data is not None)
+
+	# Files opened read-only by the caller are cached without opening them again
+	cache.clear()
+	with qidata.open(jpg_file_path) as _f:
+		loaded_file = cache.getOpenFile(_f)
+	assert(loaded_file is cache.get(jpg_file_path))
+
+	# Unless they are opened in write mode, as their content may not be saved
+	cache.clear()
+	with qidata.open(jpg_file_path, "w") as _f:
+		loaded_file = cache.getOpenFile(_f)
+	assert(loaded_file is not cache.get(jpg_file_path))
+
+def test_point_cloud_levels_of_detail():
+	indexes = randomSubsample(1000, 10)
+	assert(10 == len(indexes))
+	assert((numpy.diff(indexes) > 0).all())
+	assert((indexes == randomSubsample(1000, 10)).all())
+	assert([0, 1, 2, 3, 4] == randomSubsample(5, 10).tolist())
+
+	# Points on a 100x100 grid, with two points per node
+	xs, ys = numpy.meshgrid(numpy.arange(100), numpy.arange(100))
+	grid = numpy.dstack((xs, ys, numpy.zeros_like(xs))).reshape(-1, 3)
+	points = numpy.vstack((grid, grid)).astype(numpy.float32) / 100
+	colors = numpy.zeros((len(points), 3), dtype=numpy.uint8)
+
+	indexes = downsample(points, 1000)
+	assert(0 < len(indexes) <= 1000)
+	# Kept points are spread over the whole cloud
+	assert(points[indexes].max(axis=0)[0] > 0.9)
+
+	lod = PointCloudLOD(points, colors, 1000)
+	assert(points is lod.full[0])
+	assert(len(indexes) == len(lod.coarse[0]))
+	assert(lod.coarse is lod.coarse)
+	lod.budget = 100000
+	assert(len(points) == len(lod.coarse[0]))